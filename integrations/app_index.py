@@ -0,0 +1,162 @@
+import os
+import glob
+import shlex
+import difflib
+import logging
+import platform
+import threading
+import subprocess
+import configparser
+from utils import config, helpers
+
+# Placeholders in a .desktop Exec line that are filled in with files or urls
+DESKTOP_FIELD_CODES = ("%f", "%F", "%u", "%U", "%d", "%D", "%n", "%N", "%i", "%c", "%k", "%v", "%m")
+
+
+def application_dirs() -> list:
+    '''
+    Returns the folders applications are installed in on this system.
+    '''
+    system = platform.system()
+    if system == "Darwin":
+        return ["/Applications", "/System/Applications", "/System/Applications/Utilities", os.path.expanduser("~/Applications")]
+    if system == "Windows":
+        return [
+            os.path.join(os.environ.get("ProgramData", "C:\\ProgramData"), "Microsoft", "Windows", "Start Menu", "Programs"),
+            os.path.join(os.environ.get("APPDATA", ""), "Microsoft", "Windows", "Start Menu", "Programs"),
+        ]
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+    dirs = [data_home] + data_dirs.split(":") + ["/var/lib/flatpak/exports/share", os.path.expanduser("~/.local/share/flatpak/exports/share")]
+    return [os.path.join(folder, "applications") for folder in dirs if folder]
+
+
+def read_desktop_file(path: str):
+    '''
+    Returns the app a .desktop file launches, or None when it is hidden or
+    not an application.
+    '''
+    parser = configparser.RawConfigParser(strict=False, interpolation=None)
+    parser.optionxform = str
+    try:
+        parser.read(path, encoding="utf-8")
+        entry = parser["Desktop Entry"]
+    except (configparser.Error, KeyError, UnicodeDecodeError):
+        return None
+    if entry.get("Type") != "Application" or entry.get("NoDisplay") == "true" or entry.get("Hidden") == "true":
+        return None
+    if not entry.get("Name") or not entry.get("Exec"):
+        return None
+
+    try:
+        command = [word for word in shlex.split(entry["Exec"]) if word not in DESKTOP_FIELD_CODES]
+    except ValueError:
+        # e.g. unbalanced quotes
+        logging.error(f"Skipping {path}, its Exec line could not be parsed")
+        return None
+    aliases = [entry.get("GenericName", "")] + entry.get("Keywords", "").split(";")
+    aliases.append(os.path.splitext(os.path.basename(path))[0].split(".")[-1])
+    return {"name": entry["Name"], "aliases": [alias for alias in aliases if alias], "launch": command}
+
+
+def scan(dirs: list) -> list:
+    system = platform.system()
+    apps = []
+    for folder in dirs:
+        if system == "Darwin":
+            for path in glob.glob(os.path.join(folder, "*.app")):
+                apps.append({"name": os.path.basename(path)[:-len(".app")], "aliases": [], "launch": ["open", path]})
+        elif system == "Windows":
+            for path in glob.glob(os.path.join(folder, "**", "*.lnk"), recursive=True):
+                apps.append({"name": os.path.basename(path)[:-len(".lnk")], "aliases": [], "launch": [path]})
+        else:
+            for path in glob.glob(os.path.join(folder, "**", "*.desktop"), recursive=True):
+                app = read_desktop_file(path)
+                if app:
+                    apps.append(app)
+    return apps
+
+
+class AppIndex:
+    '''
+    Index of the installed applications, so a spoken app name can be matched
+    in-process and launched with a single spawn. Built from .desktop files on
+    Linux, .app bundles on macOS and Start Menu shortcuts on Windows, cached
+    on disk, and rebuilt when one of the application folders changes.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.signature = None
+        self.apps = []
+        self.names = {}
+        self.load()
+
+    def _signature(self) -> dict:
+        # folder mtimes change when an app is installed or removed
+        signature = {}
+        for folder in application_dirs():
+            try:
+                signature[folder] = os.stat(folder).st_mtime
+            except OSError:
+                continue
+        return signature
+
+    def refresh(self) -> None:
+        '''
+        Rebuilds the index if an application folder changed since it was built.
+        '''
+        signature = self._signature()
+        with self.lock:
+            if signature == self.signature:
+                return
+            self.apps = scan(list(signature))
+            self.signature = signature
+            self._build_names()
+            self._save()
+        logging.info(f"Indexed {len(self.apps)} applications")
+
+    def _build_names(self) -> None:
+        # caller holds the lock
+        self.names = {}
+        for app in self.apps:
+            for name in [app["name"]] + app["aliases"]:
+                self.names.setdefault(name.lower(), app)
+
+    def find(self, spoken: str):
+        '''
+        Returns the app best matching spoken: an exact name, then a name
+        starting with it when spoken is long enough to tell apps apart, then
+        the closest name, or None.
+        '''
+        self.refresh()
+        spoken = spoken.strip().lower()
+        with self.lock:
+            if spoken in self.names:
+                return self.names[spoken]
+            if len(spoken) >= config.config.get("app_match_prefix_length", 3):
+                for name, app in self.names.items():
+                    if name.startswith(spoken):
+                        return app
+            matches = difflib.get_close_matches(spoken, self.names, n=1, cutoff=config.config.get("app_match_cutoff", 0.6))
+            return self.names[matches[0]] if matches else None
+
+    def launch(self, app: dict) -> None:
+        if platform.system() == "Windows":
+            os.startfile(app["launch"][0])
+        else:
+            subprocess.Popen(app["launch"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+    def load(self) -> None:
+        data = helpers.load_json(self.path, "the application index", {})
+        self.signature = data.get("signature")
+        self.apps = data.get("apps", [])
+        self._build_names()
+
+    def _save(self) -> None:
+        # caller holds the lock
+        helpers.save_json(self.path, {"signature": self.signature, "apps": self.apps}, "the application index")
+
+
+index = AppIndex(os.path.join(config.config['cache_dir'], config.config.get('app_index_file', 'app_index.json')))
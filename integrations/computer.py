@@ -6,6 +6,7 @@ import subprocess
 import platform
 from utils.helpers import log_disabled_integration
 from utils.config import config
+from integrations import computer_linux, app_index
 
 ############################
 #      ComputerVolume      #
@@ -14,6 +15,9 @@ from utils.config import config
 def is_mac():
     return platform.system() == "Darwin"
 
+def is_linux():
+    return platform.system() == "Linux"
+
 def ComputerVolume(title):
     title_cleaned = re.sub(r'[^\w\s]', '', title).lower()
     words = title_cleaned.split()
@@ -23,6 +27,13 @@ def ComputerVolume(title):
 
     volume_word = words[2]
 
+    if is_linux():
+        try:
+            computer_linux.volume(volume_word)
+        except Exception as e:
+            logging.error(f"Failed to change volume: {e}")
+        return
+
     if is_mac():
         if volume_word == "mute":
             subprocess.run(["osascript", "-e", "set volume with output muted"])
@@ -116,6 +127,23 @@ def ComputerRun(title):
         return
 
     command = " ".join(words[2:])
+    if config.get("app_index_isenabled", True):
+        try:
+            app = app_index.index.find(command)
+        except Exception as e:
+            logging.error(f"Failed to search the application index: {e}")
+            app = None
+        if app:
+            try:
+                app_index.index.launch(app)
+                logging.info(f"Launched {app['name']} for: {command}")
+            except Exception as e:
+                logging.error(f"Failed to launch {app['name']}: {e}")
+            return
+        if is_linux():
+            logging.error(f"No installed application matches: {command}")
+            return
+
     if is_mac():
         try:
             subprocess.run(['open', '-a', f'{command}'])
@@ -160,6 +188,13 @@ def ComputerMedia(title):
 
     action = words[2]
 
+    if is_linux():
+        try:
+            computer_linux.media_action(action)
+        except Exception as e:
+            logging.error(f"Failed to execute media command: {e}")
+        return
+
     if is_mac():
         try:
             if action == "next":
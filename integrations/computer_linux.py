@@ -0,0 +1,182 @@
+import logging
+import threading
+from utils.config import config
+
+
+def connect_pulse():
+    import pulsectl
+    return pulsectl.Pulse("lamathome")
+
+
+def connect_session_bus():
+    from jeepney.io.blocking import open_dbus_connection
+    return open_dbus_connection(bus="SESSION")
+
+
+class LinuxAudio:
+    '''
+    Controls the default output through one PulseAudio connection (PipeWire
+    serves the same protocol through pipewire-pulse), kept open between
+    commands. connect is injectable so the audio service can be mocked; the
+    connection is reopened once if the server drops it.
+    '''
+
+    def __init__(self, connect=connect_pulse):
+        self.connect = connect
+        self.pulse = None
+        self.lock = threading.Lock()
+
+    def _call(self, action):
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.pulse is None:
+                        self.pulse = self.connect()
+                    sink = self.pulse.get_sink_by_name(self.pulse.server_info().default_sink_name)
+                    return action(self.pulse, sink)
+                except Exception:
+                    self.close()
+                    if attempt:
+                        raise
+
+    def set_volume(self, percent: int) -> None:
+        self._call(lambda pulse, sink: pulse.volume_set_all_chans(sink, percent / 100))
+
+    def change_volume(self, percent: int) -> int:
+        '''
+        Raises or lowers the volume by percent, clamped to 0-100, and returns
+        the new volume.
+        '''
+        def change(pulse, sink):
+            volume = min(max(pulse.volume_get_all_chans(sink) + percent / 100, 0.0), 1.0)
+            pulse.volume_set_all_chans(sink, volume)
+            return round(volume * 100)
+        return self._call(change)
+
+    def set_mute(self, muted: bool) -> None:
+        self._call(lambda pulse, sink: pulse.mute(sink, muted))
+
+    def close(self) -> None:
+        if self.pulse is not None:
+            try:
+                self.pulse.close()
+            except Exception:
+                pass
+            self.pulse = None
+
+
+class LinuxMedia:
+    '''
+    Sends media keys to MPRIS players over one D-Bus session connection,
+    kept open between commands. The player that is playing is preferred,
+    then the first one found. connect is injectable so D-Bus can be mocked.
+    '''
+
+    MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+    MPRIS_PATH = "/org/mpris/MediaPlayer2"
+    PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+
+    def __init__(self, connect=connect_session_bus):
+        self.connect = connect
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _send(self, address, method, signature=None, body=()):
+        from jeepney import new_method_call
+        from jeepney.wrappers import unwrap_msg
+
+        if self.connection is None:
+            self.connection = self.connect()
+        return unwrap_msg(self.connection.send_and_get_reply(new_method_call(address, method, signature, body)))
+
+    def _players(self) -> list:
+        from jeepney import DBusAddress
+
+        bus = DBusAddress("/org/freedesktop/DBus", bus_name="org.freedesktop.DBus", interface="org.freedesktop.DBus")
+        names = self._send(bus, "ListNames")[0]
+        return [name for name in names if name.startswith(self.MPRIS_PREFIX)]
+
+    def _status(self, player: str) -> str:
+        from jeepney import DBusAddress
+
+        properties = DBusAddress(self.MPRIS_PATH, bus_name=player, interface="org.freedesktop.DBus.Properties")
+        try:
+            return self._send(properties, "Get", "ss", (self.PLAYER_INTERFACE, "PlaybackStatus"))[0][1]
+        except Exception:
+            return ""
+
+    def _player(self):
+        players = self._players()
+        if not players:
+            return None
+        for player in players:
+            if self._status(player) == "Playing":
+                return player
+        return players[0]
+
+    def command(self, method: str) -> bool:
+        '''
+        Calls an MPRIS player method such as Next, Previous or PlayPause.
+        Returns False when no player is running.
+        '''
+        from jeepney import DBusAddress
+
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    player = self._player()
+                    if player is None:
+                        return False
+                    self._send(DBusAddress(self.MPRIS_PATH, bus_name=player, interface=self.PLAYER_INTERFACE), method)
+                    return True
+                except Exception:
+                    self.close()
+                    if attempt:
+                        raise
+
+    def close(self) -> None:
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+
+audio = LinuxAudio()
+media = LinuxMedia()
+
+
+def volume(volume_word: str) -> None:
+    if volume_word == "mute":
+        audio.set_mute(True)
+        logging.info("Muted the volume")
+    elif volume_word == "unmute":
+        audio.set_mute(False)
+        logging.info("Unmuted the volume")
+    elif volume_word == "up":
+        # each step matches one Windows volume key press, 2%
+        logging.info(f"Increased volume to {audio.change_volume(config['vol_up_step_value'] * 2)}%")
+    elif volume_word == "down":
+        logging.info(f"Decreased volume to {audio.change_volume(-config['vol_down_step_value'] * 2)}%")
+    else:
+        try:
+            volume_value = int(volume_word)
+            if volume_value < 0 or volume_value > 100:
+                raise ValueError
+        except ValueError:
+            logging.error(f"Invalid volume value: {volume_word}. Must be an integer between 0 and 100.")
+            return
+        audio.set_volume(volume_value)
+        logging.info(f"Set volume to {volume_value}%")
+
+
+def media_action(action: str) -> None:
+    methods = {"next": "Next", "back": "Previous", "play": "PlayPause", "pause": "PlayPause"}
+    if action not in methods:
+        logging.error("Invalid prompt format for Computer Media command.")
+        return
+    if media.command(methods[action]):
+        logging.info({"next": "Skipped to the next song", "back": "Skipped to the previous song"}.get(action, "Play/Pause the current song"))
+    else:
+        logging.error("No media player is running.")
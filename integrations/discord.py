@@ -1,50 +1,76 @@
-import time
 import logging
+from utils import waits
+from utils.recipient_cache import cache as recipient_cache
+from utils.browser_service import service as browser_service
 from utils.get_env import DC_EMAIL, DC_PASS
 
 
-dc_logged_in = False
-
 def login_discord(page):
     """Logs into Discord and saves authentication cookies."""
-    global dc_logged_in
-    if not dc_logged_in:
+    if not page.url.startswith("https://discord.com/login"):
         page.goto("https://discord.com/login")
-        page.fill('input[name="email"]', DC_EMAIL)
-        page.fill('input[name="password"]', DC_PASS)
-        page.wait_for_timeout(3000)  # Adjust wait time if needed
-        page.keyboard.press("Enter")
-        page.wait_for_load_state('load')
-        page.wait_for_selector('text=Friends', timeout=60000)
-        logging.info("Logged into Discord")
-        dc_logged_in = True
+    waits.step(page)
+    page.fill('input[name="email"]', DC_EMAIL)
+    page.fill('input[name="password"]', DC_PASS)
+    waits.for_selector(page, 'button[type="submit"]:enabled', "discord.login_form")
+    waits.step(page)
+    page.keyboard.press("Enter")
+    waits.for_selector(page, 'text=Friends', "discord.login", timeout=60)
+    logging.info("Logged into Discord")
+    browser_service.mark_dirty("discord")
+
+def ensure_session(page):
+    """Opens the Discord app, logging in first if the session has expired."""
+    # a warm page from the page pool is already inside the app
+    if page.url.startswith("https://discord.com/channels/"):
+        return True
+    page.goto("https://discord.com/channels/@me")
+    waits.step(page)
+    page.wait_for_load_state('load')
+    # discord sends signed out visitors to the login page
+    if page.url.startswith("https://discord.com/login"):
+        login_discord(page)
     else:
+        waits.for_selector(page, 'text=Friends', "discord.session")
         logging.info("Already logged into Discord.")
+    return True
 
 def DiscordText(page, recipient, message):
-    """Sends a message to a specific recipient on Discord."""
-    global dc_logged_in
-    if not dc_logged_in:
-        login_discord(page)
-    page.goto("https://discord.com/channels/@me")
-    page.wait_for_load_state('load')
+    """Sends a message, or a list of messages in order, to a specific recipient on Discord."""
+    messages = [message] if isinstance(message, str) else message
+    ensure_session(page)
 
     # Ensure the page is focused
+    waits.step(page)
     page.bring_to_front()
-    # Wait for the quick switcher to be visible and then click on it
-    search_Butt = page.wait_for_selector('button[class^="searchBarComponent__"]')
-    search_Butt.click()
-    quick_switcher = page.wait_for_selector('input[aria-label="Quick switcher"]')
-    quick_switcher.fill(recipient)
-    time.sleep(5)
-    quick_switcher.press("Enter")
-    time.sleep(5)  # Give time for recipient to load
-
-    # Wait for the message box to be ready
-    page.fill('div[role="textbox"]', message)
-    page.keyboard.press("Enter")
-    logging.info(f"Message '{message}' sent to '{recipient}' on Discord!")
-    time.sleep(5)
-    page.close()
-    
+    if not recipient_cache.open_conversation(page, "discord", recipient, 'div[role="textbox"]'):
+        # Wait for the quick switcher to be visible and then click on it
+        search_Butt = waits.for_selector(page, 'button[class^="searchBarComponent__"]', "discord.search_button")
+        waits.step(page)
+        search_Butt.click()
+        quick_switcher = waits.for_selector(page, 'input[aria-label="Quick switcher"]', "discord.quick_switcher")
+        waits.step(page)
+        quick_switcher.fill(recipient)
+        waits.for_selector(page, '[role="listbox"] [role="option"]', "discord.switcher_results")
+        quick_switcher.press("Enter")
+
+        # Wait for the conversation to open and its message box to be ready
+        waits.for_selector(page, 'input[aria-label="Quick switcher"]', "discord.switcher_closed", state="detached")
+        waits.for_selector(page, 'div[role="textbox"]', "discord.message_box")
+        if page.url.startswith("https://discord.com/channels/") and page.url.rstrip("/") != "https://discord.com/channels/@me":
+            recipient_cache.remember("discord", recipient, page.url)
+
+    for message in messages:
+        waits.step(page)
+        page.fill('div[role="textbox"]', message)
+        page.keyboard.press("Enter")
+
+        # The message box is cleared once Discord has taken the message
+        waits.for_function(
+            page,
+            "() => !document.querySelector('div[role=\"textbox\"]')?.innerText.trim()",
+            "discord.message_sent",
+        )
+        logging.info(f"Message '{message}' sent to '{recipient}' on Discord!")
+
     return True
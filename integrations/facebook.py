@@ -1,59 +1,83 @@
 import logging
+from utils import waits
+from utils.recipient_cache import cache as recipient_cache
+from utils.browser_service import service as browser_service
 from utils.get_env import FB_EMAIL, FB_PASS
 
 
-logged_in = False
+def ensure_session(page):
+    """Opens Facebook Messenger, logging in first if the session has expired."""
+    # a warm page from the page pool is already inside the app
+    if not page.url.startswith("https://www.messenger.com/"):
+        page.goto("https://www.messenger.com/")
+        waits.step(page)
+        page.wait_for_load_state("load")
 
-def FacebookText(page, recipient, message):
-    """Opens Facebook Messenger, logs in (if needed),
-        finds the recipient, and sends a message.
-    """
-
-    global logged_in
-    page.goto("https://www.messenger.com/")
-    page.wait_for_load_state("load")
-
-    # Login if not already logged in
-    if "messenger" in page.url and logged_in == False:
+    # Login if the login form is shown
+    if page.is_visible('input[name="email"]'):
+        waits.step(page)
         page.fill('input[name="email"]', FB_EMAIL)
         page.fill('input[name="pass"]', FB_PASS)
         page.click('button[name="login"]')
+        waits.step(page)
         page.wait_for_load_state('load')
+        waits.step(page)
         page.click('div[aria-label="Close"]', force=True)
         page.click('text="Don\'t sync"')
-        logged_in = True
+        logging.info("Logged into Facebook Messenger")
+        browser_service.mark_dirty("facebook")
+    return True
+
+def FacebookText(page, recipient, message):
+    """Opens Facebook Messenger, logs in (if needed),
+        finds the recipient, and sends a message (or a list of messages in order).
+    """
+    messages = [message] if isinstance(message, str) else message
+    ensure_session(page)
 
-    # Search for the recipient and open the conversation
-    search_box = page.locator('input[aria-label="Search Messenger"]')
-    search_box.click()
-    search_box.fill(recipient)
+    message_box_selector = 'div[aria-label="Message"]'
+    if not recipient_cache.open_conversation(page, "facebook", recipient, message_box_selector):
+        # Search for the recipient and open the conversation
+        waits.step(page)
+        search_box = page.locator('input[aria-label="Search Messenger"]')
+        search_box.click()
+        search_box.fill(recipient)
 
-    # Use a more specific selector to find the recipient
-    recipient_selector = 'a[role="presentation"][tabindex="-1"]'
-    while True:
+        # Use a more specific selector to find the recipient
+        recipient_selector = 'a[role="presentation"][tabindex="-1"]'
+        waits.for_selector(page, recipient_selector, "facebook.search_results")
         recipient_elements = page.locator(recipient_selector).all()
-        if recipient_elements:
-            break
-        page.wait_for_timeout(7000)
-
-    # Filter the elements to find the one that matches the recipient's name
-    for element in recipient_elements[1:]:
-        element_text = element.inner_text()
-        if recipient.lower() in element_text.lower():
-            element.click()
-            logging.info(f"Recipient {recipient} found.")
-            break
-    else:
-        logging.error(f"Recipient {recipient} not found.")
-        return False  # Exit the function if the recipient is not found
-
-    # Wait for the message input box to be visible and focused
-    page.wait_for_timeout(5000)
-    message_box_selector = 'div[aria-label="Message"]'
-    message_box = page.wait_for_selector(message_box_selector, state='visible')
+
+        # Filter the elements to find the one that matches the recipient's name
+        for element in recipient_elements[1:]:
+            waits.step(page)
+            element_text = element.inner_text()
+            if recipient.lower() in element_text.lower():
+                element.click()
+                logging.info(f"Recipient {recipient} found.")
+                break
+        else:
+            logging.error(f"Recipient {recipient} not found.")
+            return False  # Exit the function if the recipient is not found
+
+        # Wait for the message input box to be visible, then remember the conversation
+        waits.for_selector(page, message_box_selector, "facebook.message_box")
+        if "/t/" in page.url:
+            recipient_cache.remember("facebook", recipient, page.url)
+
+    message_box = waits.for_selector(page, message_box_selector, "facebook.message_box")
+    waits.step(page)
     message_box.click()
 
-    # Send the message
-    message_box.fill(message)
-    page.keyboard.press('Enter')
+    # Send the messages, waiting for the box to clear between them
+    for message in messages:
+        waits.step(page)
+        message_box.fill(message)
+        page.keyboard.press('Enter')
+        waits.for_function(
+            page,
+            "() => !document.querySelector('div[aria-label=\"Message\"]')?.innerText.trim()",
+            "facebook.message_sent",
+        )
+        logging.info(f"Sent message to {recipient}: {message}")
     return True
\ No newline at end of file
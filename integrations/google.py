@@ -1,17 +1,17 @@
-import time
 import logging
+from utils import helpers, waits
+from utils.browser_service import service as browser_service
+from utils.googlehome_catalog import catalog
 from utils.get_env import G_HOME_EMAIL, G_HOME_PASS
 
-def GoogleHome(page, automation):
-    timeoutamt = 30000
+def ensure_session(page):
+    """Opens Google Home, logging in and dismissing the first-run dialogs if necessary."""
 
-    """Opens Google home, logs in if necessary, and runs the automation."""
-    session_file = "cache/state.json"
-    context = page.context
-
-    page.goto("https://home.google.com")
+    # a warm page from the page pool already shows the automations
+    if not page.url.startswith("https://home.google.com/"):
+        page.goto("https://home.google.com")
+    waits.step(page)
     logging.info(f"Opening Google Home page: {page.url}")
-    logging.info(f"Automation to run: {automation}")
 
     # Check if not logged in
     first_login = False
@@ -19,70 +19,86 @@ def GoogleHome(page, automation):
         first_login = True
         logging.info("Not logged in, proceeding with login steps")
         page.wait_for_load_state('load')
+        waits.step(page)
         page.click("text=Go to Google Home")
         logging.info("Clicked 'Go to Google Home'")
 
+        waits.step(page)
         page.fill("input[type=email]", G_HOME_EMAIL)
         logging.info(f"Filled in email: {G_HOME_EMAIL}")
 
         page.click("text=Next")
         logging.info("Clicked 'Next' after email")
 
+        waits.step(page)
         page.fill("input[type=password]", G_HOME_PASS)
         logging.info("Filled in password")
 
         page.click("text=Next")
         logging.info("Clicked 'Next' after password")
 
+        waits.step(page)
         if page.is_visible("text=Simplify your sign-in"):
             page.click("text=Not now")
             logging.info("Clicked 'Not now' for simplify sign-in prompt")
 
     if first_login:
         try:
-            time.sleep(2)
-            page.click("label:has-text(\"Don't show again\")")
+            waits.for_selector(page, "label:has-text(\"Don't show again\")", "google.dont_show_again", timeout=5).click()
             logging.info("Clicked 'Don't show again' checkbox")
         except Exception as e:
-            logging.info("No 'Don't show again' checkbox found or unable to click it within 0.3 seconds")
+            logging.info("No 'Don't show again' checkbox found or unable to click it within 5 seconds")
 
         try:
-            time.sleep(2)
-            page.click("text=OK")
+            waits.for_selector(page, "text=OK", "google.ok_dialog", timeout=5).click()
             logging.info("Clicked 'OK' after logging in")
         except Exception as e:
-            logging.info("No 'OK' button found or unable to click it within 0.3 seconds")
+            logging.info("No 'OK' button found or unable to click it within 5 seconds")
+        browser_service.mark_dirty("google")
 
+    waits.step(page)
     page.wait_for_load_state('load')
-
-    logging.info("Waiting for the automation section to load")
-
-    try:
-        page.wait_for_selector(f"//div[contains(@class, 'automation-name') and normalize-space(text())='{automation}']", timeout=timeoutamt)
-        logging.info(f'Google Home "{automation}" section is visible')
-    except Exception as e:
-        logging.error(f'Google Home "{automation}" section is not available within the timeout period')
-        context.storage_state(path=session_file)
-        logging.info(f"Saved browser state to {session_file}")
-        page.close()
-        logging.info("Browser closed")
-        return
-
-    # Locate the automation div and click the play button
-    automation_div = page.locator(f"//div[contains(@class, 'automation-name') and normalize-space(text())='{automation}']").first
-    if automation_div.is_visible():
-        logging.info(f'Google Home "{automation}" was found')
-        play_button = automation_div.locator("xpath=ancestor::mat-card//button[@aria-label='Start automation']").first
-        if play_button.is_visible():
+    return True
+
+def scrape_automations(page):
+    """Returns the names of the automations shown on the Google Home page."""
+    waits.for_selector(page, "div[class*='automation-name']", "google.automations", timeout=30)
+    # whitespace is collapsed like the play button locator's normalize-space()
+    return page.evaluate(
+        "() => Array.from(document.querySelectorAll(\"div[class*='automation-name']\"), e => e.textContent.replace(/\\s+/g, ' ').trim()).filter(Boolean)"
+    )
+
+def GoogleHome(page, automations):
+    """Opens Google home, logs in if necessary, and runs the automation (or a list of automations in order)."""
+    automations = [automations] if isinstance(automations, str) else automations
+    ensure_session(page)
+    logging.info(f"Automations to run: {automations}")
+
+    # the cached catalog is used while it is fresh; the page is only read
+    # again when it is stale or an automation is missing from it
+    if catalog.is_stale() or any(catalog.find(automation) is None for automation in automations):
+        logging.info("Waiting for the automation section to load")
+        try:
+            catalog.update(scrape_automations(page))
+        except helpers.TaskTimeoutError:
+            raise
+        except Exception as e:
+            logging.error('Google Home automations are not available within the timeout period')
+            browser_service.mark_dirty("google")
+            return
+
+    for automation in automations:
+        entry = catalog.find(automation)
+        if entry is None:
+            logging.error(f'Google Home "{automation}" is not available, choose from: {", ".join(catalog.names())}')
+            continue
+
+        # Click the automation's play button
+        play_button = waits.optional(waits.for_selector, page, f"xpath={entry['play_button']}", "google.play_button", timeout=10)
+        if play_button:
             play_button.click()
-            logging.info(f'Google Home "{automation}" play button was clicked')
+            logging.info(f'Google Home "{entry["name"]}" play button was clicked')
         else:
-            logging.error(f'Play button for "{automation}" is not visible')
-    else:
-        logging.error(f'Google Home "{automation}" is not available')
-
-    context.storage_state(path=session_file)
-    logging.info(f"Saved browser state to {session_file}")
-    page.close()
-    logging.info("Browser closed")
-    
\ No newline at end of file
+            logging.error(f'Play button for "{entry["name"]}" is not visible')
+
+    browser_service.mark_dirty("google")
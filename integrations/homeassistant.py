@@ -2,7 +2,6 @@ import requests
 import logging
 from difflib import get_close_matches
 from utils.get_env import HA_TOKEN, HA_URL
-from webcolors import name_to_rgb
 
 def get_entities():
     """Fetch the list of entities and their states from Home Assistant API."""
@@ -88,6 +87,7 @@ def control_homeassistant(user_input):
                         return "Invalid brightness percentage. Please use a value between 0 and 100."
                 else:
                     # Try to convert color name to RGB
+                    from webcolors import name_to_rgb
                     rgb = name_to_rgb(action)
                     service = "turn_on"
                     payload = {
@@ -2,6 +2,8 @@ import os
 import sys
 import logging
 from utils import splash_screen, config, journal
+from utils.scheduler import scheduler
+from utils.resource_pipeline import pipeline as resource_pipeline
 
 
 def save(user_journal: journal.Journal, entry: journal.Entry) -> None:
@@ -38,7 +40,18 @@ def save(user_journal: journal.Journal, entry: journal.Entry) -> None:
                     # Fallback to cache directory if creation fails
                     save_path = os.path.expandvars(config.config['cache_dir'])
             
-            user_journal.save_resources(entry, save_path)
+            saved_files = user_journal.save_resources(entry, save_path)
+
+            # thumbnails and the folder index are made in the background
+            if saved_files:
+                resource_pipeline.submit(entry, saved_files)
+
+
+def cancel_timers() -> None:
+    '''
+    Cancel every pending delayed task.
+    '''
+    scheduler.cancel()
 
 
 def terminate() -> None:
@@ -1,32 +1,308 @@
-from interpreter import interpreter
+import time
+import queue
 import logging
-from utils import config, get_env
-
-# set api base url based on config (valid options: groq, openai, or user set url)
-if config.config.get("openinterpreter_llm_api_base") in ["groq", "openai"]:
-    if config.config.get("openinterpreter_llm_api_base") == "groq":
-        interpreter.llm.api_base = "https://api.groq.com/openai/v1"
-    elif config.config.get("openinterpreter_llm_api_base") == "openai":
-        interpreter.llm.api_base = "https://api.openai.com/v1/models"
-else:
-    interpreter.llm.api_base = config.config.get("openinterpreter_llm_api_base")
-
-if config.config.get("openinterpreter_verbose_mode_isenabled") == "true":
-    interpreter.verbose = True
-elif config.config.get("openinterpreter_verbose_mode_isenabled") == "false":
-    interpreter.verbose = False
-else:
-    logging.error("Invalid value for openinterpreter_verbose_mode_isenabled in config. Defaulting to true")
-    interpreter.verbose = True
-
-# set the rest of the OI values
-interpreter.auto_run = config.config.get("openinterpreter_auto_run_isenabled")
-interpreter.llm.api_key = config.config.get("openinterpreter_llm_api_key")
-interpreter.llm.model = config.config.get("openinterpreter_llm_model")
-interpreter.llm.temperature = config.config.get("openinterpreter_llm_temperature")
+import threading
+import multiprocessing
+from utils import config, helpers
+
+
+def settings() -> dict:
+    return {key: value for key, value in config.config.items() if key.startswith("openinterpreter_")}
+
+
+def configure(interpreter, settings: dict) -> None:
+    # set api base url based on config (valid options: groq, openai, or user set url)
+    if settings.get("openinterpreter_llm_api_base") in ["groq", "openai"]:
+        if settings.get("openinterpreter_llm_api_base") == "groq":
+            interpreter.llm.api_base = "https://api.groq.com/openai/v1"
+        elif settings.get("openinterpreter_llm_api_base") == "openai":
+            interpreter.llm.api_base = "https://api.openai.com/v1/models"
+    else:
+        interpreter.llm.api_base = settings.get("openinterpreter_llm_api_base")
+
+    if settings.get("openinterpreter_verbose_mode_isenabled") == "true":
+        interpreter.verbose = True
+    elif settings.get("openinterpreter_verbose_mode_isenabled") == "false":
+        interpreter.verbose = False
+    else:
+        logging.error("Invalid value for openinterpreter_verbose_mode_isenabled in config. Defaulting to true")
+        interpreter.verbose = True
+
+    # set the rest of the OI values
+    interpreter.auto_run = settings.get("openinterpreter_auto_run_isenabled")
+    interpreter.llm.api_key = settings.get("openinterpreter_llm_api_key")
+    interpreter.llm.model = settings.get("openinterpreter_llm_model")
+    interpreter.llm.temperature = settings.get("openinterpreter_llm_temperature")
+
+
+def message_tokens(messages: list) -> int:
+    return sum(helpers.estimate_tokens(message.get("content") or "") for message in messages)
+
+
+class SessionMemory:
+    '''
+    Keeps the interpreter's message history bounded between tasks. The
+    history is cleared after idle_reset seconds without a task, and after a
+    task the oldest turns are dropped until it fits in max_tokens. With
+    summarize, the dropped turns are replaced by a short LLM summary so the
+    session keeps their gist.
+    '''
+
+    def __init__(self, interpreter, max_tokens: int, idle_reset: float, summarize: bool):
+        self.interpreter = interpreter
+        self.max_tokens = max_tokens
+        self.idle_reset = idle_reset
+        self.summarize = summarize
+        self.last_task = time.monotonic()
+        self.resets = 0
+        self.trimmed = 0
+
+    def before_task(self, task: str) -> int:
+        '''
+        Resets the history if the session sat idle, and returns the estimated
+        prompt tokens of the next call.
+        '''
+        if self.idle_reset and self.interpreter.messages and time.monotonic() - self.last_task > self.idle_reset:
+            self.interpreter.messages = []
+            self.resets += 1
+        self.last_task = time.monotonic()
+        return message_tokens(self.interpreter.messages) + message_tokens([{"content": task}])
+
+    def after_task(self) -> None:
+        messages = self.interpreter.messages
+        if message_tokens(messages) <= self.max_tokens:
+            return
+        # drop whole turns, so the kept history starts with a user message
+        keep = len(messages)
+        while keep > 0 and message_tokens(messages[len(messages) - keep:]) > self.max_tokens * 3 // 4:
+            keep -= 1
+        while keep > 0 and messages[len(messages) - keep].get("role") != "user":
+            keep -= 1
+        dropped, kept = messages[:len(messages) - keep], messages[len(messages) - keep:]
+        self.trimmed += len(dropped)
+        summary = self._summary(dropped) if self.summarize else None
+        if summary:
+            kept = [{"role": "user", "type": "message", "content": f"Summary of our earlier conversation: {summary}"}] + kept
+        self.interpreter.messages = kept
+
+    def _summary(self, messages: list):
+        import litellm
+
+        transcript = "\n".join(f"{message.get('role')} {message.get('type')}: {message.get('content')}" for message in messages)
+        try:
+            response = litellm.completion(
+                model=self.interpreter.llm.model,
+                api_base=self.interpreter.llm.api_base,
+                api_key=self.interpreter.llm.api_key,
+                temperature=0,
+                max_tokens=self.max_tokens // 8,
+                messages=[
+                    {"role": "system", "content": "Summarize this conversation between a user and a code interpreter in a few sentences, keeping facts, file names and results that later requests may rely on."},
+                    {"role": "user", "content": transcript[-self.max_tokens * 4:]},
+                ],
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            logging.error(f"Failed to summarize the OpenInterpreter history: {e}")
+            return None
+
+    def stats(self, prompt_tokens: int) -> dict:
+        return {
+            "prompt_tokens": prompt_tokens,
+            "history_messages": len(self.interpreter.messages),
+            "history_tokens": message_tokens(self.interpreter.messages),
+            "resets": self.resets,
+            "trimmed": self.trimmed,
+        }
+
+
+def worker_main(tasks, results, settings: dict) -> None:
+    '''
+    Runs in the worker process: imports and configures the interpreter once,
+    then runs each task from tasks, putting its streamed output on results as
+    ("chunk", task_id, text) messages followed by ("done", task_id, stats) or
+    ("error", task_id, message), where stats describes the session memory.
+    '''
+    from interpreter import interpreter
+    configure(interpreter, settings)
+    memory = SessionMemory(
+        interpreter,
+        settings.get("openinterpreter_max_history_tokens", 6000),
+        settings.get("openinterpreter_idle_reset", 1800),
+        settings.get("openinterpreter_summarize_isenabled", False),
+    )
+    results.put(("ready", None, None))
+
+    while True:
+        item = tasks.get()
+        if item is None:
+            break
+        task_id, task = item
+        prompt_tokens = memory.before_task(task)
+        try:
+            for text in message_texts(interpreter.chat(task, display=False, stream=True)):
+                results.put(("chunk", task_id, text))
+            memory.after_task()
+            results.put(("done", task_id, memory.stats(prompt_tokens)))
+        except Exception as e:
+            memory.after_task()
+            results.put(("error", task_id, str(e)))
+
+
+def message_texts(chunks):
+    '''
+    Joins the streamed chunks of each message, code block and console output
+    into one text, yielded when the block ends, so a log line is a whole block
+    rather than a token.
+    '''
+    parts = []
+    for chunk in chunks:
+        if chunk.get("start"):
+            parts = []
+        content = chunk.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        if chunk.get("end") and "".join(parts).strip():
+            yield f"{chunk.get('type', 'message')}: {''.join(parts).strip()}"
+            parts = []
+
+
+class InterpreterWorker:
+    '''
+    Runs OpenInterpreter in a long-lived worker process, started on first
+    use, so the interpreter's import and the code it runs stay out of
+    LAMatHome's process. Tasks go over a queue and the output is streamed
+    back and logged as it arrives. A worker that crashes is restarted on the
+    next task; one that goes quiet for longer than stall_timeout seconds, or
+    outlives the task's deadline, is killed and restarted.
+    '''
+
+    def __init__(self, stall_timeout: float):
+        self.stall_timeout = stall_timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.lock = threading.Lock()
+        self.process = None
+        self.tasks = None
+        self.results = None
+        self.task_id = 0
+        self.stats = {"tasks": 0, "failed": 0, "restarts": 0}
+        # latest session memory stats reported by the worker
+        self.memory = {}
+        self.prompt_tokens = []
+
+    def _start(self) -> None:
+        self.tasks = self.context.Queue()
+        self.results = self.context.Queue()
+        self.process = self.context.Process(target=worker_main, args=(self.tasks, self.results, settings()), name="openinterpreter", daemon=True)
+        self.process.start()
+        logging.info(f"Started the OpenInterpreter worker (pid {self.process.pid})")
+
+    def _alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def run(self, task: str) -> None:
+        '''
+        Sends task to the worker and logs its output until it finishes.
+        Raises TaskTimeoutError when the worker stalls or the task's deadline
+        passes, and RuntimeError when the worker fails.
+        '''
+        with self.lock:
+            if not self._alive():
+                if self.process is not None:
+                    self.stats["restarts"] += 1
+                    logging.error(f"The OpenInterpreter worker exited (code {self.process.exitcode}), restarting it")
+                self._start()
+            self.task_id += 1
+            task_id = self.task_id
+            self.stats["tasks"] += 1
+            self.tasks.put((task_id, task))
+            logging.info(f"Sent to OpenInterpreter: {task}")
+
+            last_output = time.monotonic()
+            while True:
+                try:
+                    kind, result_id, text = self.results.get(timeout=1)
+                except queue.Empty:
+                    if not self._alive():
+                        self.stats["failed"] += 1
+                        raise RuntimeError(f"The OpenInterpreter worker exited (code {self.process.exitcode})")
+                    if time.monotonic() - last_output > self.stall_timeout or helpers.time_left(1) <= 0:
+                        self.stats["failed"] += 1
+                        self._stop()
+                        raise helpers.TaskTimeoutError("OpenInterpreter stalled or ran out of time, restarting it")
+                    continue
+                last_output = time.monotonic()
+                if result_id != task_id:
+                    # ready message, or output of a task that was abandoned
+                    continue
+                if kind == "chunk":
+                    logging.info(f"OpenInterpreter {text}")
+                elif kind == "done":
+                    self._record(text)
+                    return
+                else:
+                    self.stats["failed"] += 1
+                    raise RuntimeError(f"OpenInterpreter failed: {text}")
+
+    def _record(self, memory: dict) -> None:
+        self.memory = memory
+        self.prompt_tokens.append(memory["prompt_tokens"])
+        logging.info(
+            f"OpenInterpreter call used ~{memory['prompt_tokens']} prompt tokens, "
+            f"history is {memory['history_messages']} messages (~{memory['history_tokens']} tokens)"
+        )
+
+    def _stop(self) -> None:
+        if self.process is None:
+            return
+        self.process.kill()
+        self.process.join(5)
+        self.stats["restarts"] += 1
+        self.process = None
+
+    def cancel(self) -> None:
+        '''
+        Kills the worker so code it is still running for a timed out task
+        stops. The next task starts a new worker.
+        '''
+        process = self.process
+        if process is not None and process.is_alive():
+            process.kill()
+
+    def shutdown(self) -> None:
+        if self._alive():
+            self.tasks.put(None)
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+        self.process = None
+
+    def log_metrics(self) -> None:
+        if not self.stats["tasks"]:
+            return
+        logging.info(f"OpenInterpreter: {self.stats['tasks']} tasks, {self.stats['failed']} failed, {self.stats['restarts']} worker restarts")
+        if self.prompt_tokens:
+            logging.info(
+                f"OpenInterpreter memory: prompt tokens avg {sum(self.prompt_tokens) / len(self.prompt_tokens):.0f} "
+                f"max {max(self.prompt_tokens)}, history {self.memory['history_messages']} messages "
+                f"(~{self.memory['history_tokens']} tokens), {self.memory['resets']} idle resets, "
+                f"{self.memory['trimmed']} messages trimmed"
+            )
+
+
+worker = InterpreterWorker(config.config.get("openinterpreter_stall_timeout", 120))
+
 
 # Run openinterpreter based on task from llm_parse.py
 def openinterpretercall(task):
-    interpreter.chat(task)
-    logging.info(f"Sent to OpenInterpreter: {task}")
-    # logging.info(f"OpenInterpreter response: {interpreter.response}")
\ No newline at end of file
+    worker.run(task)
+
+
+def cancel():
+    # stop any code the interpreter is still running for a timed out task
+    worker.cancel()
+
+
+def shutdown():
+    worker.log_metrics()
+    worker.shutdown()
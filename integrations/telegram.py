@@ -1,43 +1,74 @@
 import logging
+from utils import waits
+from utils.recipient_cache import cache as recipient_cache
+from utils.browser_service import service as browser_service
 
-def TelegramText(context, recipient, message):
-    session_file = "cache/state.json"
-    page = context.new_page()
-    try:
+def ensure_session(page):
+    # Telegram web is logged into by scanning a QR code, so an expired session
+    # can only be detected here, not renewed
+    # a warm page from the page pool is already inside the app
+    if not page.url.startswith("https://web.telegram.org/k/"):
         page.goto("https://web.telegram.org/k/")
-        if page.is_visible('text=Chats'):
-            logging.info("Already logged in to Telegram.")
-        else:
-            logging.info("Telegram session expired, logging in again.")
+    waits.step(page)
+    if page.is_visible('text=Chats'):
+        logging.info("Already logged in to Telegram.")
+    else:
+        logging.info("Telegram session expired, logging in again.")
 
-        logging.info(f"User to search: {recipient}")
-        logging.info(f"Message to send: {message}")
+    for _ in range(3):
+        waits.step(page)
+        try:
+            waits.for_selector(page, '[placeholder=" "]', "telegram.search_box", timeout=30)
+            return True
+        except Exception:
+            waits.step(page)
+            page.reload()
+    return False
+
+def TelegramText(page, recipient, message):
+    messages = [message] if isinstance(message, str) else message
+    login_successful = False
+    try:
+        login_successful = ensure_session(page)
 
-        login_successful = False
-        for _ in range(3):
-            try:
-                page.wait_for_selector('[placeholder=" "]', timeout=30000)
-                login_successful = True
-                break
-            except:
-                page.reload()
+        logging.info(f"User to search: {recipient}")
+        logging.info(f"Messages to send: {messages}")
 
         if login_successful:
-            context.storage_state(path=session_file)
-            page.fill('[placeholder=" "]', recipient)
-            page.press('[placeholder=" "]', 'Enter')
-            page.wait_for_timeout(1000)
+            message_box_selector = '.input-message-input:nth-child(1)'
+            found = recipient_cache.open_conversation(page, "telegram", recipient, message_box_selector)
+            if not found:
+                waits.step(page)
+                page.fill('[placeholder=" "]', recipient)
+                page.press('[placeholder=" "]', 'Enter')
 
-            if page.is_visible('.search-super-content-chats a'):
-                page.click('.search-super-content-chats a')
-                page.wait_for_timeout(1000)
-                page.fill('.input-message-input:nth-child(1)', message)
-                page.click('.btn-send > .c-ripple')
-                logging.info(f"Sent message to {recipient}: {message}")
+                if waits.optional(waits.for_selector, page, '.search-super-content-chats a', "telegram.search_results", timeout=5):
+                    waits.step(page)
+                    page.click('.search-super-content-chats a')
+                    waits.for_selector(page, message_box_selector, "telegram.message_box")
+                    # the open chat's peer id is kept in the url fragment
+                    if "#" in page.url:
+                        recipient_cache.remember("telegram", recipient, page.url)
+                    found = True
+
+            if found:
+                for message in messages:
+                    waits.step(page)
+                    page.fill(message_box_selector, message)
+                    page.click('.btn-send > .c-ripple')
+                    # the input is cleared once Telegram has taken the message
+                    waits.for_function(
+                        page,
+                        "() => !document.querySelector('.input-message-input:nth-child(1)')?.innerText.trim()",
+                        "telegram.message_sent",
+                    )
+                    logging.info(f"Sent message to {recipient}: {message}")
             else:
                 logging.error("No users found, aborting.")
         else:
             logging.error("Failed to log in to Telegram after multiple attempts")
     finally:
-        page.close()  # Ensure the page is closed
-        context.storage_state(path=session_file)
\ No newline at end of file
+        # a state saved before signing in would look like a session and
+        # keep the browser headless
+        if login_successful:
+            browser_service.mark_dirty("telegram")
\ No newline at end of file
@@ -1,14 +1,22 @@
+from utils import startup  # first, so the startup report times the imports below
 import os
 import json
+import queue
 import logging
+import threading
 import coloredlogs
 from datetime import datetime, timezone
 from integrations import lam_at_home
-from utils import config, get_env, rabbit_hole, splash_screen, ui, llm_parse, task_executor, journal
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from utils import config, get_env, rabbit_hole, splash_screen, llm_parse, task_planner, work_queues, journal
+from utils import task_executor, sessions, journal_store
+from utils.resource_pipeline import pipeline as resource_pipeline
+from utils.scheduler import scheduler
+from utils.browser_service import service as browser_service
+from utils.googlehome_catalog import catalog as googlehome_catalog
+from integrations.app_index import index as app_index
 
 
-def process_utterance(journal_entry, journal: journal.Journal, playwright_context):
+def process_utterance(journal_entry, journal: journal.Journal, dry_run: bool = False):
     if isinstance(journal_entry, str):
         utterance = journal_entry
     else: 
@@ -18,35 +26,59 @@ def process_utterance(journal_entry, journal: journal.Journal, playwright_contex
     entry, promptParsed = None, None
     try:
         if utterance:
-            # split prompt into tasks
-            promptParsed = llm_parse.LLMParse(utterance, journal.get_interactions())
-            tasks = promptParsed.split("&&")
-
-            # iterate through tasks and execute each sequentially
+            # split prompt into tasks, given recent turns and relevant older ones as context
+            promptParsed = llm_parse.LLMParse(utterance, journal.get_context(utterance))
+            tasks = [task for task in promptParsed.split("&&") if task != "x"]
             for task in tasks:
-                if task != "x":
-                    logging.info(f"Task: {task}")
-                    task_executor.execute_task(playwright_context, task)
+                logging.info(f"Task: {task}")
+
+            # hand tasks to their integration's work queue, keeping per-integration order
+            if not dry_run:
+                task_planner.run_tasks(tasks)
         else:
             logging.info("No prompt found in entry, skipping LLM Parse and task execution.")
 
         # Append the completed interaction to the journal
         entry = journal.add_entry(journal_entry, llm_response=promptParsed)
 
-        if config.config['lamathomesave_isenabled'] and entry.type in config.config['lamathomesave_types']:
+        if not dry_run and config.config['lamathomesave_isenabled'] and entry.type in config.config['lamathomesave_types']:
             lam_at_home.save(journal, entry)
 
-    except PlaywrightTimeoutError:
-        logging.error("Playwright timed out while waiting for response.")
-
     except Exception as e:
-        logging.error(f"An error occurred: {e}")
+        # matched by name, so playwright is only imported once a browser starts
+        if type(e).__name__ == "TimeoutError":
+            logging.error("Playwright timed out while waiting for response.")
+        else:
+            logging.error(f"An error occurred: {e}")
+
+
+def run_due_tasks():
+    # submit tasks whose pause has elapsed
+    startup.first_poll()
+    scheduler.run_pending(task_planner.run_tasks)
+
+
+def start_browsers():
+    # log into the web integrations in the background while polling goes on
+    sessions.warm_all()
+    googlehome_catalog.refresh()
+
+
+def read_input(prompt, inputs, ready):
+    # read cli input on a separate thread so due timers still run while waiting
+    while True:
+        ready.wait()
+        ready.clear()
+        inputs.put(input(prompt))
 
 
 def main():
+    store = None
+    startup.mark("imports")
     try:
         # Check if env file exists, if not run ui.py to create it
         if not os.path.exists(config.config["env_file"]):
+            from utils import ui
             ui.create_ui()
         print(splash_screen.colored_splash)
         logging.info("LAMatHome is starting...")
@@ -62,39 +94,75 @@ def main():
                 json.dump({}, f)
 
         # Initialize journal for storing rolling transcript
-        userJournal = journal.Journal(max_entries=config.config['rolling_transcript_size'])
-
-        with sync_playwright() as p:
-            # Use firefox for full headless
-            browser = p.firefox.launch(headless=False)
-            context = browser.new_context(storage_state=state_file)  # Use state to stay logged in
-
-            user, assistant = None, None
-            if get_env.RH_ACCESS_TOKEN:
-                # fetch rabbit hole user profile
-                profile = rabbit_hole.fetch_user_profile()
-                user = profile.get('name')
-                assistant = profile.get('assistantName')
-            
-            if config.config["mode"] == "rabbit":
-                currentTimeIso = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-                logging.info(f"Welcome {user}! LAMatHome is now listening for journal entries posted by {assistant}")
-                for journal_entry in rabbit_hole.journal_entries_generator(currentTimeIso):
-                    process_utterance(journal_entry, userJournal, context)
-            
-            elif config.config["mode"] == "cli":
-                logging.info("Entering interactive mode...")
-                while True:
-                    user_input = input(f"{user}@LAMatHome> " if user else "LAMatHome> ")
-                    process_utterance(user_input, userJournal, context)
-
-            else:
-                logging.error("Invalid mode specified in config.json")
+        # backed by the journal store so history survives restarts
+        store = journal_store.open_store()
+        userJournal = journal.Journal(max_entries=config.config['rolling_transcript_size'], store=store)
+        startup.mark("journal")
+
+        # One worker queue per integration family, plus a browser lane per
+        # site that launches its own browser on its worker thread because
+        # playwright objects are bound to the thread that created them.
+        work_queues.setup()
+        browser_service.setup(state_file, task_executor.browser_sites(), on_idle=sessions.on_idle)
+        # browsers launch now, once the poller is up, or with the first task that needs one
+        browser_launch = config.config.get("browser_launch", "background")
+        if browser_launch == "startup":
+            start_browsers()
+        elif browser_launch == "background":
+            startup.defer(start_browsers)
+        if config.config.get("computer_isenabled") and config.config.get("computerrun_isenabled"):
+            # rebuild the application index if apps changed since it was cached
+            work_queues.get_queue("computer").submit(lambda _: app_index.refresh(), priority=9)
+        startup.mark("queues")
+
+        user, assistant = None, None
+        if get_env.RH_ACCESS_TOKEN:
+            # fetch rabbit hole user profile
+            profile = rabbit_hole.fetch_user_profile()
+            user = profile.get('name')
+            assistant = profile.get('assistantName')
+        startup.mark("user profile")
+        
+        if config.config["mode"] == "rabbit":
+            currentTimeIso = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+            logging.info(f"Welcome {user}! LAMatHome is now listening for journal entries posted by {assistant}")
+            for journal_entry in rabbit_hole.journal_entries_generator(currentTimeIso, on_idle=run_due_tasks):
+                process_utterance(journal_entry, userJournal)
+        
+        elif config.config["mode"] == "cli":
+            logging.info("Entering interactive mode...")
+            inputs, ready = queue.Queue(), threading.Event()
+            prompt = f"{user}@LAMatHome> " if user else "LAMatHome> "
+            threading.Thread(target=read_input, args=(prompt, inputs, ready), daemon=True).start()
+            ready.set()
+            while True:
+                run_due_tasks()
+                try:
+                    user_input = inputs.get(timeout=config.config["rabbithole_api_sleep_time"])
+                except queue.Empty:
+                    continue
+                process_utterance(user_input, userJournal)
+                ready.set()
+
+        else:
+            logging.error("Invalid mode specified in config.json")
 
     except KeyboardInterrupt:
         print("\n")
         logging.info("Program terminated by user")
     finally:
+        browser_service.log_metrics()
+        sessions.log_health()
+        work_queues.log_metrics()
+        work_queues.shutdown()
+        task_executor.shutdown()
+        resource_pipeline.shutdown()
+        resource_pipeline.log_metrics()
+        if store:
+            # write what is still queued, so the metrics cover it
+            store.flush()
+            store.log_metrics()
+            store.close()
         lam_at_home.terminate()
 
 
@@ -0,0 +1,96 @@
+'''
+Tests for reading .desktop files and matching spoken names against the
+application index, built from a temporary applications folder. Run from the
+repository root:
+    python -m pytest tests
+'''
+import os
+import tempfile
+import unittest
+from unittest import mock
+from integrations import app_index
+
+DESKTOP_ENTRY = '''[Desktop Entry]
+Type=Application
+Name={name}
+Exec={exec}
+{extra}
+'''
+
+
+class AppIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.apps_dir = os.path.join(self.tmp.name, "applications")
+        os.makedirs(self.apps_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, filename, name, exec, extra=""):
+        path = os.path.join(self.apps_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(DESKTOP_ENTRY.format(name=name, exec=exec, extra=extra))
+        return path
+
+
+class ReadDesktopFileTest(AppIndexTestCase):
+
+    def test_reads_name_aliases_and_command(self):
+        path = self.write("org.mozilla.firefox.desktop", "Firefox", "firefox --new-window %u", "GenericName=Web Browser\nKeywords=internet;www;")
+        app = app_index.read_desktop_file(path)
+        self.assertEqual(app["name"], "Firefox")
+        self.assertEqual(app["launch"], ["firefox", "--new-window"])
+        self.assertEqual(app["aliases"], ["Web Browser", "internet", "www", "firefox"])
+
+    def test_skips_hidden_entries(self):
+        path = self.write("hidden.desktop", "Hidden", "hidden", "NoDisplay=true")
+        self.assertIsNone(app_index.read_desktop_file(path))
+
+    def test_skips_unbalanced_quotes(self):
+        path = self.write("broken.desktop", "Broken", 'sh -c "echo')
+        self.assertIsNone(app_index.read_desktop_file(path))
+
+
+class FindTest(AppIndexTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for patcher in (
+            mock.patch.object(app_index, "application_dirs", return_value=[self.apps_dir]),
+            mock.patch("platform.system", return_value="Linux"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.write("firefox.desktop", "Firefox", "firefox %u")
+        self.write("gimp.desktop", "GNU Image Manipulation Program", "gimp", "GenericName=Image Editor")
+        self.write("broken.desktop", "Broken", 'sh -c "echo')
+        self.index = app_index.AppIndex(os.path.join(self.tmp.name, "app_index.json"))
+
+    def test_exact_name(self):
+        self.assertEqual(self.index.find("Firefox")["name"], "Firefox")
+
+    def test_alias(self):
+        self.assertEqual(self.index.find("image editor")["name"], "GNU Image Manipulation Program")
+
+    def test_prefix(self):
+        self.assertEqual(self.index.find("fire")["name"], "Firefox")
+
+    def test_short_names_are_not_prefix_matched(self):
+        self.assertIsNone(self.index.find("f"))
+
+    def test_close_name(self):
+        self.assertEqual(self.index.find("firefix")["name"], "Firefox")
+
+    def test_no_match(self):
+        self.assertIsNone(self.index.find("spreadsheet"))
+
+    def test_broken_file_does_not_stop_the_scan(self):
+        self.index.refresh()
+        self.assertEqual(len(self.index.apps), 2)
+        self.assertIsNotNone(self.index.signature)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+'''
+Tests for the Linux volume and media backends against fake PulseAudio and
+D-Bus connections, passed in through their connect factories. Run from the
+repository root:
+    python -m pytest tests
+'''
+import unittest
+from types import SimpleNamespace
+from integrations.computer_linux import LinuxAudio, LinuxMedia
+
+try:
+    import jeepney
+except ImportError:
+    jeepney = None
+
+
+class FakePulse:
+    '''
+    The parts of pulsectl.Pulse LinuxAudio uses, with one sink. fail makes
+    the next call raise, as when the sound server drops the connection.
+    '''
+
+    def __init__(self, volume=0.5, fail=False):
+        self.sink = SimpleNamespace(name="default", volume=volume, muted=False)
+        self.fail = fail
+        self.closed = False
+
+    def server_info(self):
+        if self.fail:
+            self.fail = False
+            raise ConnectionError("connection dropped")
+        return SimpleNamespace(default_sink_name=self.sink.name)
+
+    def get_sink_by_name(self, name):
+        return self.sink
+
+    def volume_get_all_chans(self, sink):
+        return sink.volume
+
+    def volume_set_all_chans(self, sink, volume):
+        sink.volume = volume
+
+    def mute(self, sink, muted):
+        sink.muted = muted
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSessionBus:
+    '''
+    A D-Bus session connection serving the bus's ListNames and, for each
+    MPRIS player, its PlaybackStatus and the player methods, which are
+    recorded in calls as (player, method).
+    '''
+
+    def __init__(self, players):
+        self.players = players
+        self.calls = []
+
+    def send_and_get_reply(self, message):
+        from jeepney import HeaderFields, new_method_return
+
+        destination = message.header.fields[HeaderFields.destination]
+        member = message.header.fields[HeaderFields.member]
+        if member == "ListNames":
+            return new_method_return(message, "as", (["org.freedesktop.DBus", *self.players],))
+        if member == "Get":
+            return new_method_return(message, "v", (("s", self.players[destination]),))
+        self.calls.append((destination, member))
+        return new_method_return(message)
+
+    def close(self):
+        pass
+
+
+class LinuxAudioTest(unittest.TestCase):
+
+    def test_set_volume(self):
+        pulse = FakePulse()
+        LinuxAudio(connect=lambda: pulse).set_volume(30)
+        self.assertAlmostEqual(pulse.sink.volume, 0.3)
+
+    def test_change_volume_is_clamped(self):
+        pulse = FakePulse(volume=0.95)
+        audio = LinuxAudio(connect=lambda: pulse)
+        self.assertEqual(audio.change_volume(8), 100)
+        self.assertEqual(pulse.sink.volume, 1.0)
+        pulse.sink.volume = 0.03
+        self.assertEqual(audio.change_volume(-8), 0)
+        self.assertEqual(pulse.sink.volume, 0.0)
+
+    def test_mute(self):
+        pulse = FakePulse()
+        LinuxAudio(connect=lambda: pulse).set_mute(True)
+        self.assertTrue(pulse.sink.muted)
+
+    def test_reconnects_once_after_a_dropped_connection(self):
+        connections = [FakePulse(fail=True), FakePulse()]
+        opened = []
+
+        def connect():
+            opened.append(connections[len(opened)])
+            return opened[-1]
+
+        LinuxAudio(connect=connect).set_volume(40)
+        self.assertEqual(len(opened), 2)
+        self.assertTrue(connections[0].closed)
+        self.assertAlmostEqual(connections[1].sink.volume, 0.4)
+
+    def test_gives_up_after_a_second_failure(self):
+        audio = LinuxAudio(connect=lambda: FakePulse(fail=True))
+        with self.assertRaises(ConnectionError):
+            audio.set_volume(40)
+
+
+@unittest.skipIf(jeepney is None, "jeepney is not installed")
+class LinuxMediaTest(unittest.TestCase):
+
+    def test_prefers_the_playing_player(self):
+        bus = FakeSessionBus({
+            "org.mpris.MediaPlayer2.vlc": "Paused",
+            "org.mpris.MediaPlayer2.spotify": "Playing",
+        })
+        self.assertTrue(LinuxMedia(connect=lambda: bus).command("Next"))
+        self.assertEqual(bus.calls, [("org.mpris.MediaPlayer2.spotify", "Next")])
+
+    def test_falls_back_to_the_first_player(self):
+        bus = FakeSessionBus({
+            "org.mpris.MediaPlayer2.vlc": "Paused",
+            "org.mpris.MediaPlayer2.spotify": "Stopped",
+        })
+        self.assertTrue(LinuxMedia(connect=lambda: bus).command("PlayPause"))
+        self.assertEqual(bus.calls, [("org.mpris.MediaPlayer2.vlc", "PlayPause")])
+
+    def test_no_player_running(self):
+        bus = FakeSessionBus({})
+        self.assertFalse(LinuxMedia(connect=lambda: bus).command("Next"))
+        self.assertEqual(bus.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
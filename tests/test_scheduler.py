@@ -0,0 +1,87 @@
+'''
+Tests for splitting an utterance's tasks at a pause and for the timer
+scheduler's persistence, release and cancel, with timers saved to a
+temporary file. Run from the repository root:
+    python -m pytest tests
+'''
+import os
+import tempfile
+import unittest
+from utils.scheduler import Scheduler
+from utils.task_planner import split_at_pause
+
+
+class SplitAtPauseTest(unittest.TestCase):
+
+    def test_splits_at_the_first_pause(self):
+        tasks = ["homeassistant light on", "pause 10", "homeassistant light off", "pause 5", "homeassistant fan on"]
+        self.assertEqual(
+            split_at_pause(tasks),
+            (["homeassistant light on"], 10.0, ["homeassistant light off", "pause 5", "homeassistant fan on"]),
+        )
+
+    def test_no_pause(self):
+        tasks = ["homeassistant light on", "homeassistant fan on"]
+        self.assertEqual(split_at_pause(tasks), (tasks, None, []))
+
+    def test_skips_an_invalid_pause(self):
+        tasks = ["pause soon", "homeassistant light on", "pause 2", "homeassistant light off"]
+        self.assertEqual(split_at_pause(tasks), (tasks[:2], 2.0, ["homeassistant light off"]))
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "timers.json")
+        self.scheduler = Scheduler(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_due(self, scheduler):
+        ran = []
+        scheduler.run_pending(ran.extend)
+        return ran
+
+    def test_runs_due_timers_once(self):
+        self.scheduler.schedule(0, ["homeassistant light on"])
+        self.scheduler.schedule(60, ["homeassistant light off"])
+        self.assertEqual(self.run_due(self.scheduler), ["homeassistant light on"])
+        self.assertEqual(self.run_due(self.scheduler), [])
+
+    def test_timers_survive_a_restart(self):
+        self.scheduler.schedule(0, ["homeassistant light on"])
+        self.scheduler.schedule(60, ["homeassistant light off"])
+        restarted = Scheduler(self.path)
+        self.assertEqual(len(restarted.timers), 2)
+        self.assertEqual(self.run_due(restarted), ["homeassistant light on"])
+
+    def test_held_timer_waits_for_release(self):
+        timer_id = self.scheduler.schedule(0, ["homeassistant light on"], hold=True)
+        self.assertEqual(self.run_due(self.scheduler), [])
+        self.scheduler.release(timer_id, 0)
+        self.assertEqual(self.run_due(self.scheduler), ["homeassistant light on"])
+
+    def test_held_timer_survives_a_restart(self):
+        self.scheduler.schedule(0, ["homeassistant light on"], hold=True)
+        self.assertEqual(self.run_due(Scheduler(self.path)), ["homeassistant light on"])
+
+    def test_cancel_one(self):
+        timer_id = self.scheduler.schedule(0, ["homeassistant light on"])
+        self.scheduler.schedule(0, ["homeassistant light off"])
+        self.assertEqual(self.scheduler.cancel(timer_id), 1)
+        self.assertEqual(self.scheduler.cancel(timer_id), 0)
+        self.assertEqual(self.run_due(self.scheduler), ["homeassistant light off"])
+
+    def test_cancel_all(self):
+        self.scheduler.schedule(0, ["homeassistant light on"])
+        timer_id = self.scheduler.schedule(0, ["homeassistant light off"], hold=True)
+        self.assertEqual(self.scheduler.cancel(), 2)
+        self.scheduler.release(timer_id, 0)
+        self.assertEqual(self.run_due(self.scheduler), [])
+        self.assertEqual(Scheduler(self.path).timers, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
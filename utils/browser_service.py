@@ -0,0 +1,235 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future
+from utils import config, helpers, work_queues, waits, lean_profile
+from utils.page_pool import pool as page_pool
+from utils.storage_state import saver_for
+
+# Lane that every site shares when isolated contexts are disabled
+SHARED_LANE = "browser_automation"
+
+
+class BrowserService:
+    '''
+    Runs browser automations off the main loop.
+    Sites are served by lanes: work queues whose worker thread starts its own
+    playwright instance, browser and context on the first job. Sync playwright
+    objects are bound to the thread that created them, so a lane's context is
+    only ever used by jobs on that lane's thread. With
+    browser_isolated_contexts_isenabled every site gets its own lane, so
+    automations for different sites run in parallel and keep separate
+    cookies; otherwise all sites share one lane and one context.
+    Between jobs each lane swaps in a fresh browser and context, loaded from
+    its saved storage state, once it has served browser_recycle_max_commands
+    commands or its processes use more than browser_recycle_max_rss_mb.
+    '''
+
+    def __init__(self):
+        self.state_file = None
+        self.on_idle = None
+        self.sites = {}
+        self.playwrights = {}
+        self.lifecycles = {}
+        self.launch_lock = threading.Lock()
+
+    def setup(self, state_file: str, sites: list, on_idle=None) -> None:
+        '''
+        Creates a lane for each site. Browsers are launched lazily, by the
+        first job on each lane. on_idle(site, context) is called for each of
+        a lane's sites whenever the lane is idle, on the lane's thread.
+        '''
+        self.state_file = state_file
+        self.on_idle = on_idle
+        for site in sites:
+            self.sites.setdefault(self.lane_for(site), []).append(site)
+
+        sizes = config.config.get("queue_max_sizes", {})
+        for lane in self.sites:
+            work_queues.add_queue(work_queues.WorkQueue(
+                lane,
+                sizes.get(lane, sizes.get(SHARED_LANE, 8)),
+                initializer=lambda lane=lane: self._launch(lane),
+                finalizer=lambda context, lane=lane: self._close(lane, context),
+                on_idle=lambda context, lane=lane: self._idle(lane, context),
+                refresh=lambda context, lane=lane: self._maybe_recycle(lane, context),
+            ))
+
+    def lane_for(self, site: str) -> str:
+        if config.config.get("browser_isolated_contexts_isenabled", True):
+            return f"browser_{site}"
+        return SHARED_LANE
+
+    def is_running(self, site: str) -> bool:
+        '''
+        Returns whether the site's lane has started, i.e. its browser was launched.
+        '''
+        lane = work_queues.queues.get(self.lane_for(site))
+        return lane is not None and lane.thread is not None
+
+    def saver(self, lane: str):
+        # isolated lanes keep their cookies in state.<site>.json next to state_file
+        if lane == SHARED_LANE:
+            path = self.state_file
+        else:
+            stem, ext = os.path.splitext(self.state_file)
+            path = f"{stem}.{lane[len('browser_'):]}{ext}"
+        return saver_for(lane, path)
+
+    def submit(self, site: str, fn, priority: int = 0) -> Future:
+        '''
+        Queues fn(context) on the site's lane and returns a Future with its
+        result. Raises work_queues.QueueFullError when the lane is full.
+        '''
+        return work_queues.get_queue(self.lane_for(site)).submit(fn, priority)
+
+    def mark_dirty(self, site: str) -> None:
+        '''
+        Marks the site's browser state as changed, e.g. after a login, so the
+        lane saves it when it is next idle.
+        '''
+        self.saver(self.lane_for(site)).mark_dirty()
+
+    def _launch(self, lane: str):
+        from playwright.sync_api import sync_playwright
+        # launches are serialized so the new driver process can be told apart
+        with self.launch_lock:
+            before = helpers.child_pids()
+            playwright = sync_playwright().start()
+            drivers = helpers.child_pids() - before
+        self.playwrights[lane] = playwright
+        self.lifecycles[lane] = {"drivers": drivers, "recycles": 0, "reasons": {}, "rss": None, "rss_max": 0, "rss_checked": 0.0}
+        context = self._new_context(lane)
+        logging.info(f"Started browser for {', '.join(self.sites.get(lane, [lane]))}")
+        return context
+
+    def _has_sessions(self, lane: str, state_file: str) -> bool:
+        '''
+        Returns whether the storage state has cookies or local storage for
+        every site of the lane, i.e. each of them has been signed into.
+        '''
+        from utils import task_executor
+
+        state = helpers.load_json(state_file, "browser state", {})
+        hosts = [entry.get("domain", "") for entry in state.get("cookies", [])]
+        hosts += [entry.get("origin", "").split("://")[-1] for entry in state.get("origins", [])]
+        for site in self.sites.get(lane, []):
+            site_host = task_executor.integrations[site]["page"]
+            if not any(host.lstrip(".").endswith(site_host) or site_host.endswith(host.lstrip(".")) for host in hosts if host):
+                return False
+        return True
+
+    def _new_context(self, lane: str):
+        # a new isolated lane starts from the shared state to keep existing logins
+        state_file = self.saver(lane).path
+        if not os.path.exists(state_file) or os.stat(state_file).st_size == 0:
+            state_file = self.state_file
+
+        # show the window until each site is signed into, e.g. to scan
+        # Telegram's QR code; after that the lane runs headless
+        headless = config.config.get("browser_headless", True)
+        if headless and not self._has_sessions(lane, state_file):
+            headless = False
+            logging.info(f"No saved session for {', '.join(self.sites.get(lane, [lane]))}, opening a browser window to sign in")
+        browser = self.playwrights[lane].firefox.launch(headless=headless)
+        self.lifecycles[lane]["commands_at_start"] = work_queues.get_queue(lane).stats["completed"]
+        return browser.new_context(storage_state=state_file)  # Use state to stay logged in
+
+    def _rss(self, lane: str):
+        # sampled at most every browser_rss_check_interval seconds
+        lifecycle = self.lifecycles[lane]
+        now = time.monotonic()
+        if now - lifecycle["rss_checked"] >= config.config.get("browser_rss_check_interval", 60):
+            lifecycle["rss_checked"] = now
+            lifecycle["rss"] = helpers.process_rss(lifecycle["drivers"])
+            lifecycle["rss_max"] = max(lifecycle["rss_max"], lifecycle["rss"] or 0)
+        return lifecycle["rss"]
+
+    def _maybe_recycle(self, lane: str, context):
+        '''
+        Returns the context the lane should use from now on: a fresh one when
+        the current one has crossed a recycle threshold, otherwise the same.
+        Runs on the lane's thread between jobs, so no command is interrupted.
+        '''
+        if lane not in self.lifecycles:
+            return context
+        lifecycle = self.lifecycles[lane]
+        commands = work_queues.get_queue(lane).stats["completed"] - lifecycle["commands_at_start"]
+        max_commands = config.config.get("browser_recycle_max_commands", 200)
+        max_rss = config.config.get("browser_recycle_max_rss_mb", 1500) * 1024 * 1024
+        rss = self._rss(lane)
+
+        reason = None
+        if context is None:
+            reason = "relaunch"
+        elif max_commands and commands >= max_commands:
+            reason = "commands"
+        elif max_rss and rss is not None and rss >= max_rss:
+            reason = "memory"
+        if reason is None:
+            return context
+
+        logging.info(
+            f"Recycling the {lane} browser ({reason}) after {commands} commands"
+            + (f", using {rss / 1024 / 1024:.0f} MB" if rss is not None else "")
+        )
+        for site in self.sites.get(lane, []):
+            page_pool.discard(site)
+        if context:
+            self.saver(lane).flush(context)
+            context.browser.close()
+        lifecycle["recycles"] += 1
+        lifecycle["reasons"][reason] = lifecycle["reasons"].get(reason, 0) + 1
+        lifecycle["rss_checked"] = 0.0
+        try:
+            return self._new_context(lane)
+        except Exception as e:
+            # retried when the lane is next idle
+            logging.error(f"Failed to relaunch the {lane} browser: {e}")
+            return None
+
+    def _idle(self, lane: str, context) -> None:
+        self.saver(lane).maybe_flush(context)
+        if self.on_idle and context:
+            for site in self.sites.get(lane, []):
+                self.on_idle(site, context)
+
+    def _close(self, lane: str, context) -> None:
+        for site in self.sites.get(lane, []):
+            page_pool.discard(site)
+        if context:
+            self.saver(lane).flush(context)
+            context.browser.close()
+        playwright = self.playwrights.pop(lane, None)
+        if playwright:
+            playwright.stop()
+
+    def metrics(self) -> dict:
+        '''
+        Returns per-lane memory and recycle counts.
+        '''
+        metrics = {}
+        for lane, lifecycle in self.lifecycles.items():
+            metrics[lane] = {
+                "rss": lifecycle["rss"],
+                "rss_max": lifecycle["rss_max"],
+                "recycles": lifecycle["recycles"],
+                "reasons": dict(lifecycle["reasons"]),
+            }
+        return metrics
+
+    def log_metrics(self) -> None:
+        for lane, stats in self.metrics().items():
+            rss = f"{stats['rss'] / 1024 / 1024:.0f} MB" if stats["rss"] is not None else "n/a"
+            reasons = ", ".join(f"{reason}: {count}" for reason, count in stats["reasons"].items()) or "none"
+            logging.info(
+                f"{lane}: resident memory {rss}, peak {stats['rss_max'] / 1024 / 1024:.0f} MB, "
+                f"{stats['recycles']} recycles ({reasons})"
+            )
+        page_pool.log_metrics()
+        waits.log_metrics()
+        lean_profile.log_metrics()
+
+
+service = BrowserService()
@@ -0,0 +1,124 @@
+import os
+import time
+import logging
+import threading
+from utils import config, helpers, task_executor, waits
+from utils.page_pool import pool as page_pool
+from utils.browser_service import service as browser_service
+
+# Catalog refreshes queue behind any commands already waiting on the lane
+REFRESH_PRIORITY = 9
+
+
+def xpath_literal(text: str) -> str:
+    # XPath 1.0 strings have no escapes, so a name with both quote kinds is
+    # joined from pieces with concat()
+    if "'" not in text:
+        return f"'{text}'"
+    if '"' not in text:
+        return f'"{text}"'
+    return "concat(" + ", \"'\", ".join(f"'{part}'" for part in text.split("'")) + ")"
+
+
+def play_button_locator(name: str) -> str:
+    return f"//div[contains(@class, 'automation-name') and normalize-space(.)={xpath_literal(name)}]/ancestor::mat-card//button[@aria-label='Start automation']"
+
+
+class AutomationCatalog:
+    '''
+    The automations available on home.google.com, scraped from the page and
+    cached on disk for catalog_ttl seconds, each with a play button locator
+    built from its name. The cached names are given to the LLM instead of the
+    googlehomeautomations list in config.json, and GoogleHome runs cached
+    automations without reading the page again.
+    '''
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.fetched = 0.0
+        self.automations = {}
+        self.pending = None
+        self.load()
+
+    def names(self) -> list:
+        with self.lock:
+            return list(self.automations)
+
+    def find(self, name: str):
+        '''
+        Returns the catalog entry for name, ignoring case, or None.
+        '''
+        with self.lock:
+            for automation, entry in self.automations.items():
+                if automation.lower() == name.strip().lower():
+                    return entry
+        return None
+
+    def is_stale(self) -> bool:
+        return time.time() - self.fetched >= self.ttl
+
+    def update(self, names: list) -> None:
+        '''
+        Replaces the catalog with the automations just seen on the page.
+        '''
+        automations = {name: {"name": name, "play_button": play_button_locator(name)} for name in names}
+        with self.lock:
+            changed = automations != self.automations
+            self.automations = automations
+            self.fetched = time.time()
+            self._save()
+        if changed:
+            logging.info(f"Google Home automations: {', '.join(names) or 'none'}")
+
+    def refresh(self) -> None:
+        '''
+        Scrapes the catalog in the background on the Google Home browser lane
+        when it is older than its TTL. Does nothing while the integration is
+        disabled, a refresh is already queued, or browsers launch on demand
+        and the lane has not started yet.
+        '''
+        if not (config.config.get("google_isenabled") and config.config.get("googlehome_isenabled")):
+            return
+        if not self.is_stale() or browser_service.lane_for("google") not in browser_service.sites:
+            return
+        if self.pending and not self.pending.done():
+            return
+        if config.config.get("browser_launch", "background") == "on_demand" and not browser_service.is_running("google"):
+            # don't launch a browser just to read the catalog
+            return
+        try:
+            self.pending = browser_service.submit("google", self._scrape, priority=REFRESH_PRIORITY)
+        except Exception as e:
+            logging.error(f"Could not refresh the Google Home automations: {e}")
+
+    def _scrape(self, context) -> None:
+        module = task_executor.load_integration("google")
+        page, _ = page_pool.acquire(context, "google", task_executor.integrations["google"]["page"])
+        helpers.set_deadline(task_executor.task_timeout("google"))
+        try:
+            waits.step(page)
+            module.ensure_session(page)
+            self.update(module.scrape_automations(page))
+        except Exception as e:
+            logging.error(f"Failed to read the Google Home automations: {e}")
+            page_pool.discard("google")
+        finally:
+            helpers.clear_deadline()
+
+    def load(self) -> None:
+        data = helpers.load_json(self.path, "Google Home automations", {})
+        self.fetched = data.get("fetched", 0.0)
+        # locators are rebuilt, so a cache written by an older version still works
+        self.automations = {name: {"name": name, "play_button": play_button_locator(name)} for name in data.get("automations", {})}
+
+    def _save(self) -> None:
+        # caller holds the lock
+        helpers.save_json(self.path, {"fetched": self.fetched, "automations": self.automations}, "Google Home automations", indent=2)
+
+
+catalog = AutomationCatalog(
+    os.path.join(config.config['cache_dir'], config.config.get('googlehome_catalog_file', 'googlehome_automations.json')),
+    config.config.get("googlehome_catalog_ttl", 86400),
+)
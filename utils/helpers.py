@@ -1,4 +1,144 @@
+import os
+import json
+import time
 import logging
+import threading
+
+# Deadline of the task running on the current thread, see set_deadline
+_task_state = threading.local()
+
+
+class TaskTimeoutError(Exception):
+    pass
+
 
 def log_disabled_integration(integration_name):
     logging.info(f"Attempted to call {integration_name}, but it is disabled.")
+
+
+def estimate_tokens(value) -> int:
+    # about four characters per token
+    return len(str(value)) // 4 + 1
+
+
+def write_atomic(path, text):
+    '''
+    Writes text to path through a temporary file, so a crash never leaves a
+    half written file behind. Raises OSError.
+    '''
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def load_json(path, description, default=None):
+    '''
+    Returns the JSON stored in path, or default when the file is missing or
+    unreadable. description names the data in the error log.
+    '''
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Failed to load {description} from {path}: {e}")
+        return default
+
+
+def save_json(path, data, description, **dump_kwargs):
+    '''
+    Atomically saves data to path as JSON. Returns False, after logging the
+    error, when it could not be written.
+    '''
+    try:
+        write_atomic(path, json.dumps(data, **dump_kwargs))
+        return True
+    except OSError as e:
+        logging.error(f"Failed to save {description} to {path}: {e}")
+        return False
+
+
+def set_deadline(timeout):
+    _task_state.deadline = time.monotonic() + timeout
+
+
+def clear_deadline():
+    _task_state.deadline = None
+
+
+def time_left(default=None):
+    '''
+    Returns the seconds left before the current task's deadline, or default
+    when the task has no deadline.
+    '''
+    deadline = getattr(_task_state, "deadline", None)
+    if deadline is None:
+        return default
+    return max(0.0, deadline - time.monotonic())
+
+
+def check_deadline():
+    '''
+    Raises TaskTimeoutError when the current task has run out of time.
+    Long running integrations call this between steps.
+    '''
+    if time_left(1) <= 0:
+        raise TaskTimeoutError("Task ran out of time")
+
+
+def child_pids():
+    '''
+    Returns the pids of LAMatHome's direct child processes, or an empty set
+    when psutil is not installed.
+    '''
+    try:
+        import psutil
+    except ImportError:
+        return set()
+    return {child.pid for child in psutil.Process().children()}
+
+
+def process_rss(pids):
+    '''
+    Returns the resident memory in bytes of the processes in pids and all of
+    their descendants, or None when psutil is not installed or none of them
+    are running.
+    '''
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    total = None
+    for pid in pids:
+        try:
+            parent = psutil.Process(pid)
+            for process in [parent] + parent.children(recursive=True):
+                total = (total or 0) + process.memory_info().rss
+        except psutil.Error:
+            continue
+    return total
+
+
+def browser_rss():
+    '''
+    Returns the resident memory in bytes of the playwright drivers and the
+    browser processes they launched, or None when psutil is not installed or
+    no browser is running.
+    '''
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    drivers = []
+    for child in psutil.Process().children():
+        try:
+            if "playwright" in " ".join(child.cmdline()):
+                drivers.append(child.pid)
+        except psutil.Error:
+            continue
+    return process_rss(drivers)
@@ -1,18 +1,26 @@
 import os
+import re
 import uuid
 import json
 import requests
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from collections import deque
 from typing import Dict, Any, Type, Union, Optional
 from pydantic import BaseModel, Field, field_validator
-from utils import config, rabbit_hole
+from utils import config, helpers, rabbit_hole
 
 # Ensure logging is configured to display messages
 logging.basicConfig(level=logging.INFO)
 
 
+def parse_datetime(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid date format: {value}")
+
+
 class Entry(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), alias='_id')
     userId: str
@@ -26,10 +34,7 @@ class Entry(BaseModel):
 
     @field_validator('createdOn', 'modifiedOn', mode='before')
     def convert_to_datetime(cls, value: str) -> datetime:
-        try:
-            return datetime.fromisoformat(value.replace('Z', '+00:00'))
-        except ValueError:
-            raise ValueError(f"Invalid date format: {value}")
+        return parse_datetime(value)
 
     class Config:
         extra = 'ignore'
@@ -88,10 +93,121 @@ def create_entry_model(entry_data: Dict[str, Any]) -> Entry:
     return EntryModel(**entry_data)
 
 
+class LazyEntry:
+    '''
+    A journal entry built from a trusted payload, such as one from the rabbit
+    hole poller or the journal store. Only the fields the hot path reads (id,
+    type, createdOn and utterance) are parsed up front; the full pydantic
+    model, with its validation, is built on first access to anything else,
+    such as data or get_resource_urls().
+    '''
+    __slots__ = ("id", "type", "createdOn", "utterance", "raw", "_model")
+
+    def __init__(self, entry_data: Dict[str, Any]):
+        self.raw = entry_data
+        self.id = entry_data.get('_id') or entry_data.get('id') or str(uuid.uuid4())
+        self.type = entry_data['type']
+        self.createdOn = parse_datetime(entry_data['createdOn'])
+        self.utterance = entry_data['utterance']
+        self._model = None
+
+    def model(self) -> Entry:
+        if self._model is None:
+            self._model = create_entry_model(self.raw)
+        return self._model
+
+    def __getattr__(self, name):
+        # only called for attributes that are not slots; private and dunder
+        # lookups, e.g. by copy and pickle, must not build the model
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.model(), name)
+
+    def model_dump_json(self, by_alias: bool = True) -> str:
+        return json.dumps(self.raw, default=str)
+
+
+def load_entry(entry_data: Dict[str, Any]):
+    '''
+    Returns a LazyEntry for entry_data, or a validated Entry model when
+    journal_lazy_entries_isenabled is off.
+    '''
+    if config.config.get("journal_lazy_entries_isenabled", True):
+        try:
+            return LazyEntry(entry_data)
+        except KeyError as e:
+            raise ValueError(f"Missing field {e}")
+    return create_entry_model(entry_data)
+
+
+# Words too common to say which past interactions are relevant
+STOPWORDS = {
+    "the", "and", "for", "that", "this", "what", "did", "does", "with", "you", "your", "can", "could",
+    "please", "again", "same", "like", "then", "them", "from", "have", "was", "were", "are", "all",
+    "yesterday", "today", "week", "last", "ago", "earlier", "before",
+}
+
+
+def search_terms(utterance: str) -> list:
+    return [word for word in re.findall(r"\w+", utterance.lower()) if len(word) > 2 and word not in STOPWORDS]
+
+
+def time_range(utterance: str):
+    '''
+    Returns the (since, until) UTC ISO timestamps an utterance refers to, such
+    as "yesterday", or (None, None).
+    '''
+    text = utterance.lower()
+    today = datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+    if "yesterday" in text:
+        since, until = today - timedelta(days=1), today
+    elif "today" in text or "earlier" in text:
+        since, until = today, None
+    elif "last week" in text:
+        since, until = today - timedelta(days=7), None
+    else:
+        return None, None
+    return since.astimezone(timezone.utc).isoformat(), until.astimezone(timezone.utc).isoformat() if until else None
+
+
 class Journal:
-    def __init__(self, max_entries: int):
+    '''
+    Rolling transcript of the last max_entries entries and interactions.
+    With a JournalStore the full history is also persisted, the window is
+    restored from it on startup and lookups by id fall back to it.
+    '''
+    def __init__(self, max_entries: int, store=None):
         self.entries = deque(maxlen=max_entries)
         self.interactions = deque(maxlen=max_entries)
+        self.entries_by_id = {}
+        self.interactions_by_id = {}
+        self.store = store
+        if store:
+            self._restore()
+
+    def _restore(self):
+        for entry_data in self.store.recent_entries(self.entries.maxlen):
+            try:
+                self._append_entry(load_entry(entry_data))
+            except (TypeError, ValueError) as e:
+                logging.error(f"Failed to restore journal entry: {e}")
+        for interaction in self.store.recent_interactions(self.interactions.maxlen):
+            self._append_interaction(interaction)
+        if self.interactions:
+            logging.info(f"Restored {len(self.interactions)} interactions from the journal store")
+
+    def _append_entry(self, entry: Entry):
+        # keep the id index in step with the window
+        if len(self.entries) == self.entries.maxlen:
+            self.entries_by_id.pop(self.entries[0].id, None)
+        self.entries.append(entry)
+        self.entries_by_id[entry.id] = entry
+
+    def _append_interaction(self, interaction: Dict[str, Any]):
+        if len(self.interactions) == self.interactions.maxlen:
+            self.interactions_by_id.pop(self.interactions[0]['_id'], None)
+        self.interactions.append(interaction)
+        self.interactions_by_id[interaction['_id']] = interaction
 
     def add_entry(self, entry_data: Union[Dict[str, Any], str], llm_response: str = None) -> Optional[Entry]:
         '''
@@ -104,7 +220,9 @@ class Journal:
             entry = self._create_entry(entry_data)
             if entry:  # Only add if entry is not None
                 self._log_debug(f"Entry created successfully:\n{entry.model_dump_json()}")
-                self.entries.append(entry)
+                self._append_entry(entry)
+                if self.store:
+                    self.store.add_entry(entry)
                 if llm_response:
                     self._add_interaction(entry, llm_response)
             return entry
@@ -133,8 +251,7 @@ class Journal:
         if entry_class is not None:
             self._log_debug(f"Creating entry of type: {entry_type}")
             try:
-                entry = entry_class(**entry_data)
-                return entry
+                return load_entry(entry_data)
             except Exception as e:
                 logging.error(f"Error creating entry of type {entry_type}: {e}")
                 return None
@@ -165,7 +282,7 @@ class Journal:
                     file.write(response.content)
 
                 # log success and add to saved files list
-                save_path = save_path.replace("/", "\\")
+                save_path = os.path.normpath(save_path)
                 saved_files.append(save_path)
                 logging.info(f"Saved image to {save_path}")
 
@@ -184,7 +301,9 @@ class Journal:
             "user utterance": entry.utterance['prompt'],
             "LAH action": task_response,
         }
-        self.interactions.append(interaction)
+        self._append_interaction(interaction)
+        if self.store:
+            self.store.add_interaction(interaction)
 
     def _log_debug(self, message: str):
         if config.config.get("debug", False):
@@ -197,10 +316,12 @@ class Journal:
         return list(self.entries)
 
     def get_entry_by_id(self, entry_id: str) -> Optional[Entry]:
-        for entry in self.entries:
-            if entry.id == entry_id:
-                return entry
-        return None
+        entry = self.entries_by_id.get(entry_id)
+        if entry is None and self.store:
+            entry_data = self.store.get_entry(entry_id)
+            if entry_data:
+                entry = load_entry(entry_data)
+        return entry
 
     def get_entry_by_index(self, index: int) -> Optional[Entry]:
         if 0 <= index < len(self.entries):
@@ -213,11 +334,38 @@ class Journal:
     def get_interactions(self) -> list:
         return list(self.interactions)
 
+    def get_context(self, utterance: str) -> list:
+        '''
+        Returns the interactions to give the LLM with utterance, oldest first:
+        the llm_recent_window newest ones plus up to llm_retrieval_top_k older
+        ones from the journal store that are relevant to utterance, all within
+        llm_context_token_budget tokens. Newer interactions win the budget.
+        '''
+        window = config.config.get("llm_recent_window", 5)
+        recent = list(self.interactions)[-window:] if window > 0 else []
+        relevant = []
+        if self.store:
+            top_k = config.config.get("llm_retrieval_top_k", 5)
+            recent_ids = {interaction['_id'] for interaction in recent}
+            since, until = time_range(utterance)
+            matches = self.store.search_interactions(search_terms(utterance), top_k + len(recent), since, until)
+            relevant = [interaction for interaction in matches if interaction['_id'] not in recent_ids][:top_k]
+
+        budget = config.config.get("llm_context_token_budget", 1000)
+        selected, used = [], 0
+        for interaction in list(reversed(recent)) + relevant:
+            tokens = helpers.estimate_tokens(interaction)
+            if used + tokens > budget:
+                continue
+            selected.append(interaction)
+            used += tokens
+        return sorted(selected, key=lambda interaction: interaction['date'])
+
     def get_interaction_by_id(self, entry_id: str) -> Optional[Dict[str, str]]:
-        for interaction in self.interactions:
-            if interaction['_id'] == entry_id:
-                return interaction
-        return None
+        interaction = self.interactions_by_id.get(entry_id)
+        if interaction is None and self.store:
+            interaction = self.store.get_interaction(entry_id)
+        return interaction
 
     def get_interaction_by_index(self, index: int) -> Optional[Dict[str, str]]:
         if 0 <= index < len(self.interactions):
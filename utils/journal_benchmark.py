@@ -0,0 +1,59 @@
+'''
+Compares building journal entries with the full pydantic models against
+LazyEntry, e.g. for a backlog replay. Run from the repository root:
+    python -m utils.journal_benchmark [count]
+'''
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from utils import journal
+
+
+def sample_payloads(count: int) -> list:
+    started = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    payloads = []
+    for index in range(count):
+        created = (started + timedelta(minutes=index)).isoformat().replace('+00:00', 'Z')
+        payloads.append({
+            "_id": str(uuid.uuid4()),
+            "userId": "benchmark",
+            "createdOn": created,
+            "modifiedOn": created,
+            "archived": False,
+            "type": "vision" if index % 4 == 0 else "conversation",
+            "title": f"Entry {index}",
+            "data": {
+                "conversationData": {"textContent": "Turning on the living room lights. " * 4},
+                "visionData": {"files": [{"url": f"https://example.com/{index}.jpg"}]},
+            },
+            "utterance": {"prompt": f"turn on the living room lights {index}", "intention": "CONVERSATION"},
+        })
+    return payloads
+
+
+def measure(name: str, build, payloads: list, touch) -> float:
+    started = time.perf_counter()
+    for payload in payloads:
+        touch(build(payload))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<34} {len(payloads) / elapsed:>12,.0f} entries/sec")
+    return elapsed
+
+
+def hot_path(entry):
+    # what process_utterance and the journal read for every entry
+    return entry.id, entry.type, entry.createdOn, entry.utterance['prompt']
+
+
+def main(count: int = 20000) -> None:
+    payloads = sample_payloads(count)
+    print(f"{count} entries")
+    full = measure("pydantic models", journal.create_entry_model, payloads, hot_path)
+    lazy = measure("LazyEntry", journal.LazyEntry, payloads, hot_path)
+    measure("LazyEntry, data read on each", journal.LazyEntry, payloads, lambda entry: entry.data)
+    print(f"LazyEntry is {full / lazy:.1f}x faster on the hot path")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
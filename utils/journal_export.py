@@ -0,0 +1,143 @@
+'''
+Exports the rabbit hole journal to gzipped JSON Lines, one file per month,
+and replays a time range of an export through process_utterance without
+running any tasks. An export limited to a time range is written to its own
+subdirectory of the export directory. Run from the repository root:
+    python -m utils.journal_export export [--after ISO] [--before ISO] [--out DIR]
+    python -m utils.journal_export replay [--after ISO] [--before ISO] [--out DIR]
+'''
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import logging
+import argparse
+from utils import config, rabbit_hole
+
+
+def default_export_dir():
+    return os.path.join(config.config['cache_dir'], config.config.get('journal_export_dir', 'journal_export'))
+
+
+def range_dir(out_dir, after=None, before=None):
+    '''
+    Returns the directory a filtered export is written to: a subdirectory of
+    out_dir named after the range, so it never replaces the full monthly
+    files in out_dir.
+    '''
+    name = f"from-{after or 'start'}_until-{before or 'now'}"
+    return os.path.join(out_dir, name.replace(":", "-"))
+
+
+def in_range(entry, after=None, before=None):
+    created_on = entry.get("createdOn", "")
+    return (not after or created_on > after) and (not before or created_on < before)
+
+
+def export(out_dir, after=None, before=None):
+    '''
+    Streams the journal into out_dir/journal-YYYY-MM.jsonl.gz. Only one month's
+    file is open at a time and each entry is written as it arrives, so memory
+    use stays constant. Files are written under a temporary name and replace
+    the previous export when the stream completes. An export limited by after
+    or before goes to its own directory, see range_dir, since its monthly
+    files would otherwise replace archived entries outside the range.
+    Returns the number of entries written.
+    '''
+    if after or before:
+        out_dir = range_dir(out_dir, after, before)
+    os.makedirs(out_dir, exist_ok=True)
+    # left behind by an interrupted export
+    for tmp_path in glob.glob(os.path.join(out_dir, "journal-*.jsonl.gz.tmp")):
+        os.remove(tmp_path)
+    started = time.perf_counter()
+    written, current_month, current_file = 0, None, None
+    partitions = {}
+
+    try:
+        for entry in rabbit_hole.stream_user_journal():
+            if not in_range(entry, after, before):
+                continue
+            month = entry["createdOn"][:7]
+            if month != current_month:
+                if current_file:
+                    current_file.close()
+                # a month seen before is appended as another gzip member
+                path = partitions.setdefault(month, os.path.join(out_dir, f"journal-{month}.jsonl.gz.tmp"))
+                current_file = gzip.open(path, 'at' if os.path.exists(path) else 'wt', encoding='utf-8')
+                current_month = month
+            current_file.write(json.dumps(entry, separators=(',', ':')) + "\n")
+            written += 1
+    finally:
+        if current_file:
+            current_file.close()
+
+    for tmp_path in partitions.values():
+        os.replace(tmp_path, tmp_path[:-len(".tmp")])
+
+    elapsed = time.perf_counter() - started
+    logging.info(
+        f"Exported {written} journal entries into {len(partitions)} monthly files in {out_dir} "
+        f"in {elapsed:.1f}s ({written / elapsed if elapsed else 0:.0f} entries/sec)"
+    )
+    return written
+
+
+def read_export(out_dir, after=None, before=None):
+    '''
+    Yields the exported entries between after and before, in file order,
+    skipping monthly files outside the range.
+    '''
+    for path in sorted(glob.glob(os.path.join(out_dir, "journal-*.jsonl.gz"))):
+        month = os.path.basename(path)[len("journal-"):len("journal-YYYY-MM")]
+        if (after and month < after[:7]) or (before and month > before[:7]):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                if in_range(entry, after, before):
+                    yield entry
+
+
+def replay(out_dir, after=None, before=None):
+    '''
+    Feeds exported entries through process_utterance in dry-run mode: each
+    prompt is parsed into tasks by the LLM and logged, but nothing runs and
+    the replayed entries only go into a throwaway journal.
+    '''
+    import main
+    from utils import journal
+
+    replay_journal = journal.Journal(max_entries=config.config['rolling_transcript_size'])
+    started = time.perf_counter()
+    count = 0
+    for entry in read_export(out_dir, after, before):
+        main.process_utterance(entry, replay_journal, dry_run=True)
+        count += 1
+    elapsed = time.perf_counter() - started
+    logging.info(f"Replayed {count} journal entries in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f} entries/sec)")
+    return count
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Export or replay the rabbit hole journal.")
+    parser.add_argument("command", choices=["export", "replay"])
+    parser.add_argument("--after", help="only entries created after this ISO timestamp")
+    parser.add_argument("--before", help="only entries created before this ISO timestamp")
+    parser.add_argument("--out", default=default_export_dir(), help="directory of the monthly export files")
+    parsed = parser.parse_args(args)
+    for timestamp in (parsed.after, parsed.before):
+        if timestamp and not rabbit_hole.is_valid_iso_format(timestamp):
+            parser.error(f"Invalid timestamp: {timestamp}")
+    return parsed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args(sys.argv[1:])
+    if args.command == "export":
+        export(args.out, args.after, args.before)
+    else:
+        replay(args.out, args.after, args.before)
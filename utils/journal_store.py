@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import queue
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from utils import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    createdOn TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_type ON entries (type);
+CREATE INDEX IF NOT EXISTS entries_createdOn ON entries (createdOn);
+
+CREATE TABLE IF NOT EXISTS interactions (
+    id TEXT PRIMARY KEY,
+    createdOn TEXT NOT NULL,
+    utterance TEXT NOT NULL,
+    action TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interactions_createdOn ON interactions (createdOn);
+"""
+
+# Full-text index over interactions, kept in step with the table by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE interactions_fts USING fts5(utterance, action, content='interactions', content_rowid='rowid');
+CREATE TRIGGER interactions_fts_insert AFTER INSERT ON interactions BEGIN
+    INSERT INTO interactions_fts (rowid, utterance, action) VALUES (new.rowid, new.utterance, new.action);
+END;
+CREATE TRIGGER interactions_fts_delete AFTER DELETE ON interactions BEGIN
+    INSERT INTO interactions_fts (interactions_fts, rowid, utterance, action) VALUES ('delete', old.rowid, old.utterance, old.action);
+END;
+INSERT INTO interactions_fts (interactions_fts) VALUES ('rebuild');
+"""
+
+
+class JournalStore:
+    '''
+    Persistent journal history in SQLite (WAL mode) under cache_dir.
+    Writers only queue the entry, which takes microseconds; a writer thread
+    serializes queued entries and commits them in batches. Reads use their
+    own connection, which WAL lets run alongside the writer. Interactions
+    are also indexed for full-text search when SQLite has FTS5.
+    '''
+
+    def __init__(self, path: str, batch_size: int = 100):
+        self.path = path
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "write_total": 0.0, "searches": 0, "search_total": 0.0, "search_max": 0.0}
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.reader = self._connect()
+        self.reader.executescript(SCHEMA)
+        self.fts = self._create_fts()
+        self.read_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._writer, name="lah-journal-writer", daemon=True)
+        self.thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        # INSERT OR REPLACE only fires the delete trigger with recursive triggers on
+        connection.execute("PRAGMA recursive_triggers=ON")
+        return connection
+
+    def _create_fts(self) -> bool:
+        exists = self.reader.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'interactions_fts'"
+        ).fetchone()
+        if exists:
+            return True
+        try:
+            # indexes any history written before the index existed
+            self.reader.executescript(FTS_SCHEMA)
+            return True
+        except sqlite3.OperationalError as e:
+            logging.error(f"Full-text search of the journal is not available: {e}")
+            return False
+
+    def add_entry(self, entry) -> None:
+        self.queue.put(("entry", entry))
+        self.stats["queued"] += 1
+
+    def add_interaction(self, interaction: dict) -> None:
+        self.queue.put(("interaction", interaction))
+        self.stats["queued"] += 1
+
+    def _writer(self) -> None:
+        connection = self._connect()
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = (None in batch)
+            items = [item for item in batch if item is not None]
+            if items:
+                self._write(connection, items)
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                break
+        connection.close()
+
+    def _write(self, connection, items) -> None:
+        started = time.perf_counter()
+        entries, interactions = [], []
+        for kind, item in items:
+            if kind == "entry":
+                entries.append((item.id, item.type, item.createdOn.isoformat(), item.model_dump_json(by_alias=True)))
+            else:
+                interactions.append((
+                    item["_id"], item["date"].isoformat(), item["user utterance"], item["LAH action"] or "",
+                ))
+        try:
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", entries)
+                connection.executemany("INSERT OR REPLACE INTO interactions VALUES (?, ?, ?, ?)", interactions)
+        except sqlite3.Error as e:
+            logging.error(f"Failed to write {len(items)} journal records to {self.path}: {e}")
+            return
+        self.stats["written"] += len(items)
+        self.stats["batches"] += 1
+        self.stats["write_total"] += time.perf_counter() - started
+
+    def flush(self) -> None:
+        '''
+        Waits until everything queued so far has been written.
+        '''
+        self.queue.join()
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+        with self.read_lock:
+            self.reader.close()
+
+    def _query(self, sql: str, params=()) -> list:
+        with self.read_lock:
+            return self.reader.execute(sql, params).fetchall()
+
+    def get_entry(self, entry_id: str):
+        '''
+        Returns the stored payload of an entry as a dict, or None.
+        '''
+        rows = self._query("SELECT payload FROM entries WHERE id = ?", (entry_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def get_interaction(self, entry_id: str):
+        rows = self._query("SELECT id, createdOn, utterance, action FROM interactions WHERE id = ?", (entry_id,))
+        return self._interaction(rows[0]) if rows else None
+
+    def recent_entries(self, limit: int) -> list:
+        '''
+        Returns the payloads of the newest limit entries, oldest first.
+        '''
+        rows = self._query("SELECT payload FROM entries ORDER BY createdOn DESC LIMIT ?", (limit,))
+        return [json.loads(payload) for payload, in reversed(rows)]
+
+    def recent_interactions(self, limit: int) -> list:
+        rows = self._query(
+            "SELECT id, createdOn, utterance, action FROM interactions ORDER BY createdOn DESC LIMIT ?", (limit,)
+        )
+        return [self._interaction(row) for row in reversed(rows)]
+
+    def search_interactions(self, terms: list, limit: int, since: str = None, until: str = None) -> list:
+        '''
+        Returns up to limit interactions matching any of terms, best match
+        first by BM25, optionally limited to createdOn in [since, until).
+        Without terms, e.g. for "what did I do yesterday", returns the
+        newest interactions in the range instead.
+        '''
+        if not terms and not (since or until):
+            return []
+        if terms and not self.fts:
+            return []
+        started = time.perf_counter()
+        if terms:
+            sql = (
+                "SELECT i.id, i.createdOn, i.utterance, i.action FROM interactions_fts "
+                "JOIN interactions i ON i.rowid = interactions_fts.rowid WHERE interactions_fts MATCH ?"
+            )
+            params = [" OR ".join('"' + term.replace('"', '""') + '"' for term in terms)]
+        else:
+            sql = "SELECT i.id, i.createdOn, i.utterance, i.action FROM interactions i WHERE 1"
+            params = []
+        if since:
+            sql += " AND i.createdOn >= ?"
+            params.append(since)
+        if until:
+            sql += " AND i.createdOn < ?"
+            params.append(until)
+        sql += " ORDER BY bm25(interactions_fts) LIMIT ?" if terms else " ORDER BY i.createdOn DESC LIMIT ?"
+        params.append(limit)
+        try:
+            rows = self._query(sql, params)
+        except sqlite3.Error as e:
+            logging.error(f"Journal search failed: {e}")
+            return []
+
+        elapsed = time.perf_counter() - started
+        self.stats["searches"] += 1
+        self.stats["search_total"] += elapsed
+        self.stats["search_max"] = max(self.stats["search_max"], elapsed)
+        if config.config.get("debug", False):
+            logging.info(f"Journal search for {terms} found {len(rows)} interactions in {elapsed * 1000:.2f}ms")
+        return [self._interaction(row) for row in rows]
+
+    @staticmethod
+    def _interaction(row) -> dict:
+        entry_id, created_on, utterance, action = row
+        return {
+            "_id": entry_id,
+            "date": datetime.fromisoformat(created_on),
+            "user utterance": utterance,
+            "LAH action": action,
+        }
+
+    def log_metrics(self) -> None:
+        batches = self.stats["batches"] or 1
+        logging.info(
+            f"Journal store: {self.stats['written']}/{self.stats['queued']} records written in "
+            f"{self.stats['batches']} batches, avg {self.stats['write_total'] / batches * 1000:.2f}ms per batch"
+        )
+        if self.stats["searches"]:
+            logging.info(
+                f"Journal search: {self.stats['searches']} searches, "
+                f"avg {self.stats['search_total'] / self.stats['searches'] * 1000:.2f}ms, "
+                f"max {self.stats['search_max'] * 1000:.2f}ms"
+            )
+
+
+def open_store():
+    '''
+    Opens the journal store configured in config.json, or returns None when
+    it is disabled.
+    '''
+    if not config.config.get("journal_store_isenabled", True):
+        return None
+    path = os.path.join(config.config['cache_dir'], config.config.get('journal_store_file', 'journal.db'))
+    try:
+        return JournalStore(path, config.config.get("journal_store_batch_size", 100))
+    except sqlite3.Error as e:
+        logging.error(f"Failed to open the journal store at {path}: {e}")
+        return None
@@ -0,0 +1,86 @@
+import time
+import logging
+from urllib.parse import urlparse
+from utils import config, helpers
+
+# Per-site counters for blocked requests and page-ready times
+stats = {}
+
+
+def _site_stats(site):
+    return stats.setdefault(site, {"blocked": 0, "allowed": 0, "loads": 0, "ready_total": 0.0, "ready_max": 0.0})
+
+
+def _host_matches(host, domains):
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+def make_route_handler(site):
+    '''
+    Returns a playwright route handler for site that aborts images, media,
+    fonts and tracker domains, except for what the site's allowlist needs.
+    '''
+    blocked_types = set(config.config.get("browser_blocked_resource_types", []))
+    blocked_domains = config.config.get("browser_blocked_domains", [])
+    allowlist = config.config.get("browser_route_allowlist", {}).get(site, [])
+    site_stats = _site_stats(site)
+
+    def handle(route):
+        request = route.request
+        host = urlparse(request.url).hostname or ""
+        if not _host_matches(host, allowlist) and (
+            request.resource_type in blocked_types or _host_matches(host, blocked_domains)
+        ):
+            site_stats["blocked"] += 1
+            route.abort()
+        else:
+            site_stats["allowed"] += 1
+            route.continue_()
+
+    return handle
+
+
+def _track_ready_time(page, site):
+    # time from a main frame navigation to its load event, without touching the page
+    site_stats = _site_stats(site)
+    navigation = {"started": None}
+
+    def on_navigated(frame):
+        if frame == page.main_frame:
+            navigation["started"] = time.perf_counter()
+
+    def on_load(_):
+        if navigation["started"] is None:
+            return
+        ready = time.perf_counter() - navigation["started"]
+        navigation["started"] = None
+        site_stats["loads"] += 1
+        site_stats["ready_total"] += ready
+        site_stats["ready_max"] = max(site_stats["ready_max"], ready)
+
+    page.on("framenavigated", on_navigated)
+    page.on("load", on_load)
+
+
+def new_page(context, site):
+    '''
+    Opens a page for site, with request blocking when the lean profile is
+    enabled, and tracks how long its navigations take to load.
+    '''
+    page = context.new_page()
+    if config.config.get("browser_lean_profile_isenabled", True):
+        page.route("**/*", make_route_handler(site))
+    _track_ready_time(page, site)
+    return page
+
+
+def log_metrics():
+    for site, site_stats in stats.items():
+        ready_avg = site_stats["ready_total"] / site_stats["loads"] if site_stats["loads"] else 0.0
+        logging.info(
+            f"{site} page loads: {site_stats['loads']}, ready avg {ready_avg:.2f}s max {site_stats['ready_max']:.2f}s, "
+            f"{site_stats['blocked']} requests blocked, {site_stats['allowed']} allowed"
+        )
+    rss = helpers.browser_rss()
+    if rss is not None:
+        logging.info(f"Browser and driver resident memory: {rss / 1024 / 1024:.0f} MB")
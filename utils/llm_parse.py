@@ -1,8 +1,8 @@
 import os
 import re
 import logging
-from groq import Groq
 from utils import config, get_env
+from utils.googlehome_catalog import catalog as googlehome_catalog
 from integrations.homeassistant import get_entities
 
 def get_api_configuration():
@@ -13,12 +13,16 @@ def get_api_configuration():
         raise ValueError("No valid API key found. Please set GROQ_API_KEY in your environment variables.")
 
 def LLMParse(user_prompt, transcript=None, temperature=0.1, top_p=1):
+    from groq import Groq
+
     api_key = get_api_configuration()
 
     client = Groq(api_key=api_key)
 
     # Variables for the prompt:
-    googlehome_automations = config.config.get("googlehomeautomations", [])
+    # scraped from home.google.com, falling back to the hand written list
+    googlehome_catalog.refresh()
+    googlehome_automations = googlehome_catalog.names() or config.config.get("googlehomeautomations", [])
     
     # Fetch Home Assistant entities and states
     ha_entities = get_entities()
@@ -103,7 +107,8 @@ def LLMParse(user_prompt, transcript=None, temperature=0.1, top_p=1):
             Notes: Words to map (when a user says [one thing], assume they mean [other thing]). You have some creative control here. Use your best judgement:
             [Lam at Home]=[lamathome], [Lamb at Home]=[lamathome]
             lamathome: lamathome [Command]
-            Prompt from User: lamathome terminate (closes lamathome. This is the only lamathome integration.)
+            Prompt from User: lamathome terminate (closes lamathome.)
+            Prompt from User: lamathome cancel (cancels every pending paused or delayed command.)
 
             openinterpreter: openinterpreter [Command]
             Prompt from User: Tell open interpreter to find the file on my desktop called file.txt, then send it to JohnDoe@gmail.com via gmail.
@@ -193,6 +198,7 @@ def LLMParse(user_prompt, transcript=None, temperature=0.1, top_p=1):
             Let's play LAMatHome roulette. → [Random integration] [Random action] [Random]
             Use open interpreter to open the telegram app. → Openinterpreter Open the Telegram app.
             Turn off Lamb at home. → lamathome terminate
+            Never mind, cancel the timer. → lamathome cancel
             Open two random websites. → Browser site [Pick a real, random website to open, including https://]&&Browser site [Another real, random website to open including https://]
             Open command prompt on my computer. → Computer run command prompt
             Let's play browser roulette. → Browser site [Pick a real, random website to open, including https://]
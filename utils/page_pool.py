@@ -0,0 +1,108 @@
+import time
+import logging
+from urllib.parse import urlparse
+from utils import config, lean_profile
+
+
+class PagePool:
+    '''
+    Keeps one warm, logged-in page per site alive between commands.
+    Pages are health-checked before reuse and recycled after max_uses
+    commands or when a command on them fails. Only the thread that owns the
+    playwright context may use the pool.
+    '''
+
+    def __init__(self, max_uses: int):
+        self.max_uses = max_uses
+        self.pages = {}
+        self.stats = {}
+
+    def acquire(self, context, site: str, host: str):
+        '''
+        Returns (page, warm) for site, reusing its pooled page when healthy.
+        '''
+        entry = self.pages.get(site)
+        if entry and self.is_healthy(entry["page"], host):
+            entry["uses"] += 1
+            return entry["page"], True
+
+        if entry:
+            logging.info(f"Recycling unhealthy {site} page")
+            self.discard(site)
+        page = lean_profile.new_page(context, site)
+        self.pages[site] = {"page": page, "uses": 1, "created": time.time()}
+        return page, False
+
+    def release(self, site: str, ok: bool, warm: bool, duration: float) -> None:
+        '''
+        Returns a page to the pool after a command, recycling it on failure or
+        once it has served max_uses commands, and records how long the command
+        took on a warm or cold page.
+        '''
+        self._record(site, warm, duration)
+        entry = self.pages.get(site)
+        if not entry:
+            return
+        if not ok:
+            logging.info(f"Recycling {site} page after a failed command")
+            self.discard(site)
+        elif entry["uses"] >= self.max_uses:
+            logging.info(f"Recycling {site} page after {entry['uses']} uses")
+            self.discard(site)
+
+    def is_healthy(self, page, host: str) -> bool:
+        try:
+            if page.is_closed():
+                return False
+            if host and not (urlparse(page.url).hostname or "").endswith(host):
+                return False
+            return page.evaluate("document.readyState") in ("interactive", "complete")
+        except Exception:
+            return False
+
+    def discard(self, site: str) -> None:
+        entry = self.pages.pop(site, None)
+        if entry and not entry["page"].is_closed():
+            try:
+                entry["page"].close()
+            except Exception as e:
+                logging.error(f"Failed to close {site} page: {e}")
+
+    def _record(self, site: str, warm: bool, duration: float) -> None:
+        stats = self.stats.setdefault(site, {"cold": 0, "cold_total": 0.0, "warm": 0, "warm_total": 0.0})
+        kind = "warm" if warm else "cold"
+        stats[kind] += 1
+        stats[f"{kind}_total"] += duration
+        if config.config.get("debug", False):
+            logging.info(f"{site} command took {duration:.2f}s on a {kind} page")
+
+    def metrics(self) -> dict:
+        '''
+        Returns per-site averages for cold and warm commands and the time saved
+        by warm reuse, estimated as warm uses times the difference in averages.
+        '''
+        metrics = {}
+        for site, stats in self.stats.items():
+            cold_avg = stats["cold_total"] / stats["cold"] if stats["cold"] else None
+            warm_avg = stats["warm_total"] / stats["warm"] if stats["warm"] else None
+            saved = stats["warm"] * (cold_avg - warm_avg) if cold_avg is not None and warm_avg is not None else 0.0
+            metrics[site] = {
+                "cold": stats["cold"],
+                "cold_avg": cold_avg,
+                "warm": stats["warm"],
+                "warm_avg": warm_avg,
+                "saved": saved,
+            }
+        return metrics
+
+    def log_metrics(self) -> None:
+        for site, stats in self.metrics().items():
+            cold_avg = f"{stats['cold_avg']:.2f}s" if stats["cold_avg"] is not None else "n/a"
+            warm_avg = f"{stats['warm_avg']:.2f}s" if stats["warm_avg"] is not None else "n/a"
+            logging.info(
+                f"{site} pages: {stats['cold']} cold (avg {cold_avg}), {stats['warm']} warm (avg {warm_avg}), "
+                f"warm reuse saved {stats['saved']:.1f}s"
+            )
+
+
+pool = PagePool(config.config.get("page_pool_max_uses", 25))
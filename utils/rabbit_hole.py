@@ -90,6 +90,27 @@ def fetch_user_journal():
     return requests.post(url, headers=headers, json=body)
 
 
+def stream_user_journal():
+    '''
+    Yields the user's journal entries one at a time while the response is
+    still downloading, so memory use does not grow with the journal's size.
+    Raises on a failed or interrupted download, so a partial journal is
+    never mistaken for the whole one.
+    '''
+    import ijson
+
+    url = f"{BASE_URL}/fetchUserJournal"
+    body = {"accessToken": RH_ACCESS_TOKEN}
+    try:
+        with requests.post(url, headers=headers, json=body, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            yield from ijson.items(response.raw, 'journal.entries.item', use_float=True)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Request error: {e}")
+        raise
+
+
 def is_valid_iso_format(timestamp):
     '''
     Check if the given timestamp is in ISO format.
@@ -125,11 +146,14 @@ def get_journals(before=None, after=None):
     return journalEntries
 
 
-def journal_entries_generator(after_timestamp, intention_filter=None):
+def journal_entries_generator(after_timestamp, intention_filter=None, on_idle=None):
     '''
     Generator to get all journal entries in real-time after the given timestamp.
+    on_idle is called once per polling cycle, e.g. to run due timers.
     '''
     while True:
+        if on_idle:
+            on_idle()
         new_entries = get_journals(after=after_timestamp)
         if new_entries:
             for entry in new_entries:
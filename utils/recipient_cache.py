@@ -0,0 +1,77 @@
+import os
+import logging
+import threading
+from utils import config, helpers, waits
+
+
+class RecipientCache:
+    '''
+    Persistent map from (integration, recipient name) to the direct URL of the
+    conversation, captured the first time the recipient is found by search.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.load()
+
+    @staticmethod
+    def _key(integration: str, recipient: str) -> str:
+        return f"{integration}:{recipient.strip().lower()}"
+
+    def get(self, integration: str, recipient: str):
+        with self.lock:
+            return self.entries.get(self._key(integration, recipient))
+
+    def remember(self, integration: str, recipient: str, url: str) -> None:
+        if not config.config.get("recipient_cache_isenabled", True):
+            return
+        key = self._key(integration, recipient)
+        with self.lock:
+            if self.entries.get(key) == url:
+                return
+            self.entries[key] = url
+            self._save()
+        logging.info(f"Cached {integration} conversation for {recipient}: {url}")
+
+    def forget(self, integration: str, recipient: str) -> None:
+        with self.lock:
+            if self.entries.pop(self._key(integration, recipient), None) is not None:
+                self._save()
+
+    def open_conversation(self, page, integration: str, recipient: str, ready_selector: str) -> bool:
+        '''
+        Navigates straight to the cached conversation for recipient.
+        Returns True once ready_selector is visible there. A stale link is
+        dropped from the cache and False is returned, so the caller can fall
+        back to searching for the recipient.
+        '''
+        if not config.config.get("recipient_cache_isenabled", True):
+            return False
+        url = self.get(integration, recipient)
+        if not url:
+            return False
+        waits.step(page)
+        try:
+            page.goto(url)
+            waits.for_selector(page, ready_selector, f"{integration}.cached_conversation",
+                               timeout=config.config.get("recipient_cache_timeout", 10))
+            logging.info(f"Opened cached {integration} conversation for {recipient}")
+            return True
+        except helpers.TaskTimeoutError:
+            raise
+        except Exception as e:
+            logging.info(f"Cached {integration} conversation for {recipient} is stale, searching instead: {e}")
+            self.forget(integration, recipient)
+            return False
+
+    def load(self) -> None:
+        self.entries = helpers.load_json(self.path, "recipient cache", {})
+
+    def _save(self) -> None:
+        # caller holds the lock
+        helpers.save_json(self.path, self.entries, "recipient cache", indent=2)
+
+
+cache = RecipientCache(os.path.join(config.config['cache_dir'], config.config.get('recipient_cache_file', 'recipients.json')))
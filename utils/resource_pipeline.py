@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils import config
+
+# EXIF tags worth keeping in the index
+EXIF_TAGS = ("DateTime", "Make", "Model", "Orientation", "Software")
+
+
+def process_image(path: str, thumbnail_dir: str, size: int) -> dict:
+    '''
+    Runs in a worker process: writes a JPEG thumbnail of the image at path
+    and returns its dimensions, a few EXIF fields and the thumbnail path.
+    '''
+    from PIL import Image, ExifTags
+
+    started = time.perf_counter()
+    with Image.open(path) as image:
+        width, height = image.size
+        exif = {}
+        for tag, value in image.getexif().items():
+            name = ExifTags.TAGS.get(tag)
+            if name in EXIF_TAGS:
+                exif[name] = value if isinstance(value, (int, float)) else str(value)
+
+        os.makedirs(thumbnail_dir, exist_ok=True)
+        thumbnail = os.path.join(thumbnail_dir, os.path.splitext(os.path.basename(path))[0] + ".jpg")
+        image.thumbnail((size, size))
+        image.convert("RGB").save(thumbnail, "JPEG", quality=80)
+
+    return {
+        "path": path,
+        "thumbnail": thumbnail,
+        "width": width,
+        "height": height,
+        "exif": exif,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+class ResourcePipeline:
+    '''
+    Post-processes saved journal resources in a process pool, off the
+    utterance loop: each image gets a thumbnail, and its dimensions and EXIF
+    data are appended to index.jsonl in its folder together with the entry's
+    id, type and creation time. At most max_pending images wait at once;
+    further images are skipped rather than blocking the caller.
+    '''
+
+    def __init__(self, workers: int, max_pending: int, thumbnail_size: int):
+        self.workers = workers
+        self.thumbnail_size = thumbnail_size
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.index_lock = threading.Lock()
+        # guards executor, which a done callback replaces when the pool breaks
+        self.lock = threading.Lock()
+        self.executor = None
+        self.stats = {"submitted": 0, "processed": 0, "failed": 0, "skipped": 0, "busy_total": 0.0}
+
+    def submit(self, entry, paths: list) -> None:
+        '''
+        Queues the saved files of entry for post-processing and returns
+        immediately.
+        '''
+        if not config.config.get("resource_pipeline_isenabled", True):
+            return
+        with self.lock:
+            if self.executor is None:
+                # spawn, since forking a process that runs browser threads is unsafe
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            executor = self.executor
+
+        meta = {"id": entry.id, "type": entry.type, "createdOn": entry.createdOn.isoformat()}
+        for path in paths:
+            if not self.slots.acquire(blocking=False):
+                self.stats["skipped"] += 1
+                logging.error(f"Image post-processing is busy, skipping {path}")
+                continue
+            self.stats["submitted"] += 1
+            thumbnail_dir = os.path.join(os.path.dirname(path), "thumbnails")
+            try:
+                future = executor.submit(process_image, path, thumbnail_dir, self.thumbnail_size)
+            except (BrokenProcessPool, RuntimeError) as e:
+                # broken, or shut down by a callback that found it broken
+                self.slots.release()
+                self.stats["failed"] += 1
+                self._discard(executor)
+                logging.error(f"Failed to post-process {path}: {e}")
+                return
+            future.add_done_callback(lambda future, path=path: self._done(future, path, meta, executor))
+
+    def _discard(self, executor) -> None:
+        # the next submit starts a new pool; the broken one is shut down
+        # without waiting, since its workers are gone
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False)
+
+    def _done(self, future, path: str, meta: dict, executor) -> None:
+        self.slots.release()
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # a worker died
+            self.stats["failed"] += 1
+            self._discard(executor)
+            logging.error(f"Failed to post-process {path}: {e}")
+            return
+        except Exception as e:
+            self.stats["failed"] += 1
+            logging.error(f"Failed to post-process {path}: {e}")
+            return
+
+        self.stats["processed"] += 1
+        self.stats["busy_total"] += result.pop("seconds")
+        record = dict(meta, **result)
+        index_path = os.path.join(os.path.dirname(path), "index.jsonl")
+        try:
+            with self.index_lock, open(index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, separators=(',', ':')) + "\n")
+        except OSError as e:
+            logging.error(f"Failed to update {index_path}: {e}")
+
+    def shutdown(self) -> None:
+        '''
+        Waits for queued images and stops the worker processes.
+        '''
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+    def log_metrics(self) -> None:
+        if not self.stats["submitted"] and not self.stats["skipped"]:
+            return
+        processed = self.stats["processed"] or 1
+        logging.info(
+            f"Image post-processing: {self.stats['processed']}/{self.stats['submitted']} done, "
+            f"{self.stats['failed']} failed, {self.stats['skipped']} skipped, "
+            f"avg {self.stats['busy_total'] / processed:.2f}s per image"
+        )
+
+
+pipeline = ResourcePipeline(
+    config.config.get("resource_pipeline_workers", 2),
+    config.config.get("resource_pipeline_max_pending", 32),
+    config.config.get("resource_thumbnail_size", 256),
+)
@@ -0,0 +1,110 @@
+import os
+import time
+import heapq
+import uuid
+import logging
+import threading
+from utils import config, helpers
+
+
+class Scheduler:
+    '''
+    In-process timer heap for delayed tasks.
+    Timers are kept ordered by due time and persisted to disk so pending
+    timers survive a restart. The main loop pumps the scheduler with
+    run_pending() between polls.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.heap = []  # (due, timer_id), cancelled timers are skipped lazily
+        self.timers = {}
+        self.load()
+
+    def schedule(self, delay: float, tasks: list, hold: bool = False) -> str:
+        '''
+        Schedules tasks to run after delay seconds and returns the timer id.
+        A held timer is saved right away but only starts counting down once
+        release() is called, e.g. when the tasks before a pause have finished.
+        After a restart a held timer counts from when it was scheduled.
+        '''
+        timer_id = str(uuid.uuid4())
+        due = time.time() + delay
+        with self.lock:
+            self.timers[timer_id] = {"id": timer_id, "due": due, "tasks": tasks}
+            if not hold:
+                heapq.heappush(self.heap, (due, timer_id))
+            self._save()
+        logging.info(f"Scheduled {len(tasks)} task(s) to run in {delay:g} seconds")
+        return timer_id
+
+    def release(self, timer_id: str, delay: float) -> None:
+        '''
+        Starts a held timer, due delay seconds from now. Does nothing if the
+        timer was cancelled in the meantime.
+        '''
+        with self.lock:
+            timer = self.timers.get(timer_id)
+            if timer is None:
+                return
+            timer["due"] = time.time() + delay
+            heapq.heappush(self.heap, (timer["due"], timer_id))
+            self._save()
+
+    def cancel(self, timer_id: str = None) -> int:
+        '''
+        Cancels the given timer, or every pending timer when no id is given.
+        Returns the number of timers cancelled.
+        '''
+        with self.lock:
+            if timer_id is None:
+                cancelled = len(self.timers)
+                self.timers.clear()
+                self.heap = []
+            else:
+                cancelled = 1 if self.timers.pop(timer_id, None) else 0
+            self._save()
+        logging.info(f"Cancelled {cancelled} pending timer(s)")
+        return cancelled
+
+    def pop_due(self) -> list:
+        '''
+        Removes and returns every timer that is due.
+        '''
+        now = time.time()
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, timer_id = heapq.heappop(self.heap)
+                timer = self.timers.pop(timer_id, None)
+                if timer:
+                    due.append(timer)
+            if due:
+                self._save()
+        return due
+
+    def run_pending(self, callback) -> None:
+        '''
+        Calls callback with the task list of every due timer.
+        '''
+        for timer in self.pop_due():
+            try:
+                callback(timer["tasks"])
+            except Exception as e:
+                logging.error(f"Scheduled tasks {timer['tasks']} failed: {e}")
+
+    def load(self) -> None:
+        timers = helpers.load_json(self.path, "pending timers", [])
+        for timer in timers:
+            self.timers[timer["id"]] = timer
+            heapq.heappush(self.heap, (timer["due"], timer["id"]))
+        if timers:
+            logging.info(f"Restored {len(timers)} pending timer(s)")
+
+    def _save(self) -> None:
+        # caller holds the lock
+        helpers.save_json(self.path, list(self.timers.values()), "pending timers")
+
+
+scheduler = Scheduler(os.path.join(config.config['cache_dir'], config.config.get('timers_file', 'timers.json')))
@@ -0,0 +1,106 @@
+import time
+import logging
+import threading
+from utils import config, helpers, task_executor, waits, work_queues
+from utils.page_pool import pool as page_pool
+from utils.browser_service import service as browser_service
+
+# Session checks queue behind any commands already waiting on a lane
+CHECK_PRIORITY = 9
+
+# Last known session state per web integration: status is ok, expired or error
+health = {}
+lock = threading.Lock()
+
+
+def enabled_sites():
+    '''
+    Returns the web integrations that are enabled in config.json.
+    '''
+    sites = []
+    for site in task_executor.browser_sites():
+        spec = task_executor.integrations[site]
+        flags = [spec["flag"]] + [flag for flag, _, _ in spec["commands"].values() if flag]
+        if all(config.config.get(flag, False) for flag in flags):
+            sites.append(site)
+    return sites
+
+
+def _record(site, status, duration, detail=None):
+    with lock:
+        previous = health.get(site, {}).get("status")
+        health[site] = {"status": status, "checked": time.monotonic(), "duration": duration, "detail": detail}
+    if status == "ok":
+        if previous != "ok":
+            logging.info(f"{site} session is ready after {duration:.1f}s")
+    else:
+        logging.error(f"{site} session is {status}" + (f": {detail}" if detail else ""))
+
+
+def check(site, context):
+    '''
+    Opens the site on its pooled page and lets the integration's
+    ensure_session() log in again if needed, then records the result. Runs on
+    the site's browser lane.
+    '''
+    spec = task_executor.integrations[site]
+    module = task_executor.load_integration(spec["module"])
+    timeout = task_executor.task_timeout(site)
+    started = time.perf_counter()
+    try:
+        page, _ = page_pool.acquire(context, site, spec["page"])
+        helpers.set_deadline(timeout)
+        waits.step(page)
+        status, detail = ("ok" if module.ensure_session(page) else "expired"), None
+    except Exception as e:
+        status, detail = "error", str(e)
+    finally:
+        helpers.clear_deadline()
+    if status != "ok":
+        page_pool.discard(site)
+    _record(site, status, time.perf_counter() - started, detail)
+    return status
+
+
+def warm_all():
+    '''
+    Checks the session of every enabled web integration in the background.
+    Each site runs on its own browser lane, so the checks run concurrently
+    and the poller can start right away. Returns the futures.
+    '''
+    if not config.config.get("session_warmup_isenabled", True):
+        return []
+    futures = []
+    for site in enabled_sites():
+        try:
+            futures.append(browser_service.submit(
+                site, lambda context, site=site: check(site, context), priority=CHECK_PRIORITY,
+            ))
+        except work_queues.QueueFullError as e:
+            logging.error(f"Could not warm up the {site} session: {e}")
+    return futures
+
+
+def on_idle(site, context):
+    '''
+    Idle hook for the browser lanes: re-checks a warmed site every
+    session_check_interval seconds while its session is healthy, and every
+    session_retry_interval seconds after a failed check.
+    '''
+    with lock:
+        entry = health.get(site)
+    if entry is None or site not in enabled_sites():
+        return
+    if entry["status"] == "ok":
+        interval = config.config.get("session_check_interval", 900)
+    else:
+        interval = config.config.get("session_retry_interval", 300)
+    if time.monotonic() - entry["checked"] >= interval:
+        check(site, context)
+
+
+def log_health():
+    with lock:
+        entries = dict(health)
+    for site, entry in entries.items():
+        logging.info(f"{site} session: {entry['status']}, last check took {entry['duration']:.1f}s")
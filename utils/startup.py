@@ -0,0 +1,100 @@
+'''
+Times LAMatHome's cold start, from the first import in main.py to the first
+journal poll, and runs the work deferred until then. Imported first by
+main.py so its clock and the import timer cover the other imports. The
+report lists the time spent in each startup phase and the slowest imports,
+cumulative like python -X importtime.
+'''
+import sys
+import time
+import logging
+import builtins
+import threading
+import multiprocessing
+from utils import config
+
+started = time.perf_counter()
+phases = []
+imports = {}
+deferred = []
+lock = threading.Lock()
+_last_mark = started
+_original_import = builtins.__import__
+_polled = False
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level:
+        return _original_import(name, globals, locals, fromlist, level)
+    # submodules named in fromlist that may get loaded by this import
+    submodules = [item for item in fromlist or () if item != "*" and f"{name}.{item}" not in sys.modules]
+    if name in sys.modules and all(hasattr(sys.modules[name], item) for item in submodules):
+        return _original_import(name, globals, locals, fromlist, level)
+    begin = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        new = [item for item in submodules if f"{name}.{item}" in sys.modules]
+        label = f"{name}.{{{','.join(new)}}}" if len(new) > 1 else f"{name}.{new[0]}" if new else name
+        imports[label] = imports.get(label, 0.0) + time.perf_counter() - begin
+
+
+# spawned workers re-import main.py but never poll, so only time the parent.
+# parent_process() is only set after that import, the process name before it
+if config.config.get("startup_report_isenabled", True) and multiprocessing.current_process().name == "MainProcess":
+    builtins.__import__ = _timed_import
+
+
+def mark(phase: str) -> None:
+    '''
+    Ends the current startup phase, naming it phase.
+    '''
+    global _last_mark
+    now = time.perf_counter()
+    phases.append((phase, now - _last_mark))
+    _last_mark = now
+
+
+def defer(fn) -> None:
+    '''
+    Runs fn after the first poll, or right away when it already happened.
+    '''
+    with lock:
+        if not _polled:
+            deferred.append(fn)
+            return
+    fn()
+
+
+def first_poll() -> None:
+    '''
+    Called when the poller is about to poll. The first time, it stops the
+    import timer, logs the startup report and runs the deferred work.
+    '''
+    global _polled
+    with lock:
+        if _polled:
+            return
+        _polled = True
+    mark("start polling")
+    builtins.__import__ = _original_import
+    if config.config.get("startup_report_isenabled", True):
+        log_report()
+    for fn in deferred:
+        try:
+            fn()
+        except Exception as e:
+            logging.error(f"Deferred startup work failed: {e}")
+    deferred.clear()
+
+
+def log_report() -> None:
+    total = _last_mark - started
+    target = config.config.get("startup_target_seconds", 1.0)
+    logging.info(
+        f"First poll {total:.2f}s after start ({'within' if total <= target else 'over'} the {target:g}s target): "
+        + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in phases)
+    )
+    slowest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:config.config.get("startup_report_imports", 8)]
+    if slowest:
+        logging.info("Slowest imports (cumulative): " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in slowest))
@@ -0,0 +1,100 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import config, helpers
+
+
+class StorageStateSaver:
+    '''
+    Persists the browser context's storage state (cookies and local storage)
+    so sessions survive restarts.
+    Integrations mark the state dirty instead of writing it themselves; the
+    browser thread calls maybe_flush() between jobs, which serializes the
+    state at most once per debounce interval. Unchanged state is skipped and
+    the disk write happens on a writer thread, atomically via temp + rename.
+    '''
+
+    def __init__(self, path: str, debounce: float):
+        self.path = path
+        self.debounce = debounce
+        self.lock = threading.Lock()
+        self.dirty_since = None
+        self.last_digest = self._file_digest()
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lah-state-writer")
+        self.pending_write = None
+        self.stats = {"flushes": 0, "writes": 0, "skipped": 0}
+
+    def mark_dirty(self) -> None:
+        with self.lock:
+            if self.dirty_since is None:
+                self.dirty_since = time.monotonic()
+
+    def maybe_flush(self, context, force: bool = False) -> None:
+        '''
+        Serializes and writes the state if it has been dirty for at least the
+        debounce interval, or right away when force is set. Must run on the
+        thread that owns the playwright context.
+        '''
+        with self.lock:
+            if self.dirty_since is None or context is None:
+                return
+            if not force and time.monotonic() - self.dirty_since < self.debounce:
+                return
+            self.dirty_since = None
+
+        try:
+            state = context.storage_state()
+        except Exception as e:
+            logging.error(f"Failed to read browser storage state: {e}")
+            self.mark_dirty()
+            return
+
+        data = json.dumps(state, sort_keys=True)
+        digest = hashlib.sha256(data.encode()).hexdigest()
+        self.stats["flushes"] += 1
+        if digest == self.last_digest:
+            self.stats["skipped"] += 1
+            return
+        self.last_digest = digest
+        self.pending_write = self.writer.submit(self._write, data)
+
+    def flush(self, context) -> None:
+        '''
+        Writes any dirty state now and waits for the write, e.g. on shutdown.
+        '''
+        self.maybe_flush(context, force=True)
+        if self.pending_write:
+            self.pending_write.result()
+
+    def _write(self, data: str) -> None:
+        try:
+            helpers.write_atomic(self.path, data)
+            self.stats["writes"] += 1
+            if config.config.get("debug", False):
+                logging.info(f"Saved browser state to {self.path}")
+        except OSError as e:
+            logging.error(f"Failed to save browser state to {self.path}: {e}")
+            self.last_digest = None
+
+    def _file_digest(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.dumps(json.load(f), sort_keys=True)
+            return hashlib.sha256(data.encode()).hexdigest()
+        except (OSError, ValueError):
+            return None
+
+
+savers = {}
+
+
+def saver_for(name: str, path: str) -> StorageStateSaver:
+    '''
+    Returns the saver for a browser context, creating it on first use.
+    '''
+    if name not in savers:
+        savers[name] = StorageStateSaver(path, config.config.get("storage_state_debounce", 30))
+    return savers[name]
@@ -1,168 +1,356 @@
+import sys
 import logging
+import importlib
+import threading
 import time
-from utils import config, helpers
-from integrations import browser, computer, discord, facebook, google, lam_at_home, open_interpreter, telegram, homeassistant
+from collections import namedtuple
+from utils import config, helpers, lean_profile, waits
+from utils.page_pool import pool as page_pool
+from utils.browser_service import service as browser_service
 
-def execute_task(context, text):
+# A parsed LLM command: "<integration> <recipient> <message...>".
+# For a batch of message tasks, message is the list of messages in order.
+Task = namedtuple("Task", ["text", "integration", "recipient", "message"])
+
+# Outcome of a task. status is one of ok, error, timeout, disabled, invalid or rejected
+TaskResult = namedtuple("TaskResult", ["text", "status", "duration", "detail"])
+
+# Any sub-command matches this key when an integration has a single feature
+ANY_COMMAND = "*"
+
+# Registry of integrations keyed by the command verb the LLM emits.
+# Each entry names the module under integrations/ that implements it; the module
+# is only imported the first time one of its commands is dispatched, so
+# integrations that are disabled in config.json cost nothing at startup.
+integrations = {}
+
+
+def register(verb, module, flag, name, commands, family=None, page=None, cancel=None, batch=False, shutdown=None):
+    '''
+    Registers an integration with the dispatcher.
+    commands maps a sub-command (the second word of the task) to a tuple of
+    (enable flag or None, display name, handler). Handlers are called with the
+    loaded module, the playwright context (or a page on the integration's site
+    when page names the site's host) and the parsed Task.
+    family names the work queue the integration's tasks run on; integrations
+    without a family run on the calling thread. Integrations with a page run
+    on their site's browser lane.
+    cancel is called with the loaded module when a task overruns its timeout.
+    shutdown is called with the module at exit, if it was loaded.
+    batch marks messaging integrations whose consecutive tasks to the same
+    recipient are delivered together in one conversation session.
+    '''
+    integrations[verb] = {
+        "module": module,
+        "flag": flag,
+        "name": name,
+        "commands": commands,
+        "family": family,
+        "page": page,
+        "cancel": cancel,
+        "batch": batch,
+        "shutdown": shutdown,
+    }
+
+
+def load_integration(module):
+    '''
+    Imports an integration module on first use.
+    '''
+    return importlib.import_module(f"integrations.{module}")
+
+
+def shutdown():
+    '''
+    Runs the shutdown hook of each integration that was loaded.
+    '''
+    for spec in integrations.values():
+        module = sys.modules.get(f"integrations.{spec['module']}")
+        if spec["shutdown"] and module:
+            try:
+                spec["shutdown"](module)
+            except Exception as e:
+                logging.error(f"Failed to shut down {spec['name']}: {e}")
+
+
+def parse_task(text):
+    '''
+    Splits a task string into its integration, recipient and message parts.
+    '''
     words = text.split()
     if len(words) < 2:
-        logging.error("Command did not provide enough parameters.")
-        return
-    
+        return None
     integration = words[0].strip('.,!?:;"').lower()
     recipient = words[1].strip('.,!?:;"').lower()
     message = ' '.join(words[2:]).strip()
-    
-    if integration == "pause":
+    return Task(text, integration, recipient, message)
+
+
+def parse_batch(texts):
+    '''
+    Parses a batch of message tasks to one recipient into a single Task whose
+    message is the list of messages.
+    '''
+    tasks = [parse_task(text) for text in texts]
+    first = tasks[0]
+    return Task(describe(texts), first.integration, first.recipient, [task.message for task in tasks])
+
+
+def describe(text):
+    '''
+    Returns a task, or a batch of tasks, as a single display string.
+    '''
+    return " && ".join(text) if isinstance(text, list) else text
+
+
+def batch_key(text):
+    task = parse_task(text)
+    if task is None or not integrations.get(task.integration, {}).get("batch"):
+        return None
+    return task.integration, task.recipient
+
+
+def batch_tasks(tasks):
+    '''
+    Groups consecutive message tasks for the same (integration, recipient) so
+    they are delivered in one conversation session, in order. Returns a list
+    of task strings and lists of task strings.
+    '''
+    if not config.config.get("batch_messages_isenabled", True):
+        return list(tasks)
+
+    batched = []
+    previous_key = None
+    for text in tasks:
+        key = batch_key(text)
+        if key is not None and key == previous_key:
+            if isinstance(batched[-1], list):
+                batched[-1].append(text)
+            else:
+                batched[-1] = [batched[-1], text]
+        else:
+            batched.append(text)
+        previous_key = key
+    return batched
+
+
+def log_homeassistant_result(result):
+    logging.info(result)
+
+
+register("browser", "browser", "browser_isenabled", "Browser", {
+    "site": ("browsersite_isenabled", "BrowserSite", lambda m, ctx, t: m.BrowserSite(t.message)),
+    "google": ("browsergoogle_isenabled", "BrowserGoogle", lambda m, ctx, t: m.BrowserGoogle(t.message)),
+    "youtube": ("browseryoutube_isenabled", "BrowserYoutube", lambda m, ctx, t: m.BrowserYoutube(t.message)),
+    "gmail": ("browsergmail_isenabled", "BrowserGmail", lambda m, ctx, t: m.BrowserGmail(t.message)),
+    "amazon": ("browseramazon_isenabled", "BrowserAmazon", lambda m, ctx, t: m.BrowserAmazon(t.message)),
+}, family="computer")
+
+register("computer", "computer", "computer_isenabled", "Computer", {
+    "volume": ("computervolume_isenabled", "ComputerVolume", lambda m, ctx, t: m.ComputerVolume(t.text)),
+    "run": ("computerrun_isenabled", "ComputerRun", lambda m, ctx, t: m.ComputerRun(t.text)),
+    "media": ("computermedia_isenabled", "ComputerMedia", lambda m, ctx, t: m.ComputerMedia(t.text)),
+    "power": ("computerpower_isenabled", "ComputerPower", lambda m, ctx, t: m.ComputerPower(t.text)),
+}, family="computer")
+
+register("discord", "discord", "discord_isenabled", "Discord", {
+    ANY_COMMAND: ("discordtext_isenabled", "DiscordText",
+                  lambda m, page, t: m.DiscordText(page, t.recipient, t.message)),
+}, family="browser_automation", page="discord.com", batch=True)
+
+register("facebook", "facebook", "facebook_isenabled", "Facebook", {
+    ANY_COMMAND: ("facebooktext_isenabled", "FacebookText",
+                  lambda m, page, t: m.FacebookText(page, t.recipient, t.message)),
+}, family="browser_automation", page="messenger.com", batch=True)
+
+register("google", "google", "google_isenabled", "Google", {
+    ANY_COMMAND: ("googlehome_isenabled", "GoogleHome",
+                  lambda m, page, t: m.GoogleHome(page, t.message)),
+}, family="browser_automation", page="home.google.com", batch=True)
+
+register("lamathome", "lam_at_home", "lamathome_isenabled", "LAMatHome", {
+    "terminate": ("lamathometerminate_isenabled", "LAMatHomeTerminate", lambda m, ctx, t: m.terminate()),
+    "cancel": (None, "LAMatHomeCancel", lambda m, ctx, t: m.cancel_timers()),
+})
+
+register("openinterpreter", "open_interpreter", "openinterpreter_isenabled", "OpenInterpreter", {
+    ANY_COMMAND: (None, "OpenInterpreter",
+                  lambda m, ctx, t: m.openinterpretercall(' '.join(t.text.split()[1:]).strip())),
+}, family="openinterpreter", cancel=lambda m: m.cancel(), shutdown=lambda m: m.shutdown())
+
+register("telegram", "telegram", "telegram_isenabled", "Telegram", {
+    ANY_COMMAND: ("telegramtext_isenabled", "TelegramText",
+                  lambda m, page, t: m.TelegramText(page, t.recipient, t.message)),
+}, family="browser_automation", page="web.telegram.org", batch=True)
+
+register("homeassistant", "homeassistant", "homeassistant_isenabled", "HomeAssistant", {
+    ANY_COMMAND: (None, "HomeAssistant",
+                  lambda m, ctx, t: log_homeassistant_result(m.control_homeassistant(t.text))),
+}, family="homeassistant")
+
+
+def task_route(text):
+    '''
+    Returns (lane, family) for a task string or batch. Tasks in the same lane
+    keep their order; family names the work queue to run on, or None for the
+    calling thread. Pause tasks return the "pause" lane, which the planner
+    treats as a barrier.
+    '''
+    task = parse_task(text[0] if isinstance(text, list) else text)
+    if task is None:
+        return "invalid", None
+    if task.integration == "pause":
+        return "pause", None
+    spec = integrations.get(task.integration)
+    if spec is None:
+        return task.integration, None
+    if spec["page"]:
+        return task.integration, browser_service.lane_for(task.integration)
+    return task.integration, spec["family"]
+
+
+def browser_sites():
+    '''
+    Returns the integrations that automate a web page, one browser lane each.
+    '''
+    return [verb for verb, spec in integrations.items() if spec["page"]]
+
+
+def task_timeout(integration):
+    '''
+    Returns the timeout in seconds for an integration's tasks.
+    '''
+    timeouts = config.config.get("task_timeouts", {})
+    return timeouts.get(integration, timeouts.get("default", 120))
+
+
+def _is_timeout(error):
+    # playwright's TimeoutError does not derive from the builtin one
+    return isinstance(error, (TimeoutError, helpers.TaskTimeoutError)) or type(error).__name__ == "TimeoutError"
+
+
+def _run_on_page(module, context, handler, task, timeout, host):
+    '''
+    Runs a browser automation on a page whose waits are bounded by the task's
+    timeout. With the page pool enabled the site's warm page is reused and
+    handed back afterwards; otherwise, or when the task fails, the page is
+    closed, which also cancels anything still pending on it. Runs on the
+    thread that owns the playwright context.
+    '''
+    pooled = config.config.get("page_pool_isenabled", True)
+    if pooled:
+        page, warm = page_pool.acquire(context, task.integration, host)
+    else:
+        page, warm = lean_profile.new_page(context, task.integration), False
+    helpers.set_deadline(timeout)
+    waits.step(page)
+    started = time.perf_counter()
+    status, detail = "ok", None
+    try:
+        handler(module, page, task)
+    except Exception as e:
+        status, detail = ("timeout" if _is_timeout(e) else "error"), str(e)
+    finally:
+        helpers.clear_deadline()
+        if pooled:
+            page_pool.release(task.integration, status == "ok", warm, time.perf_counter() - started)
+        elif not page.is_closed():
+            page.close()
+    return status, detail
+
+
+def _run_in_thread(module, context, handler, task, timeout, cancel):
+    '''
+    Runs a handler on a helper thread and stops waiting for it after timeout
+    seconds, calling the integration's cancel hook so a stuck task cannot
+    stall its queue.
+    '''
+    outcome = {"status": "error", "detail": None}
+
+    def target():
+        helpers.set_deadline(timeout)
+        try:
+            handler(module, context, task)
+            outcome["status"] = "ok"
+        except Exception as e:
+            outcome["status"] = "timeout" if _is_timeout(e) else "error"
+            outcome["detail"] = str(e)
+        finally:
+            helpers.clear_deadline()
+
+    thread = threading.Thread(target=target, name=f"lah-{task.integration}-task", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        if cancel:
+            try:
+                cancel(module)
+            except Exception as e:
+                logging.error(f"Failed to cancel '{task.text}': {e}")
+        return "timeout", f"No result after {timeout:g} seconds"
+    return outcome["status"], outcome["detail"]
+
+
+def execute_task(context, text):
+    '''
+    Executes a single task, or a batch from batch_tasks, and returns a
+    TaskResult. Tasks on an integration family are bounded by the
+    integration's timeout from task_timeouts.
+    '''
+    started = time.perf_counter()
+    task = parse_batch(text) if isinstance(text, list) else parse_task(text)
+    text = describe(text)
+
+    def result(status, detail=None):
+        return TaskResult(text, status, time.perf_counter() - started, detail)
+
+    if task is None:
+        logging.error("Command did not provide enough parameters.")
+        return result("invalid", "Command did not provide enough parameters.")
+
+    if task.integration == "pause":
         try:
-            pause_time = float(recipient)
+            pause_time = float(task.recipient)
             logging.info(f"Pausing for {pause_time} seconds")
             time.sleep(pause_time)
-            return
+            return result("ok")
         except ValueError:
-            logging.error(f"Invalid pause time: {recipient}. Must be a number.")
-            return
-
-    if integration == "browser":
-        if not config.config["browser_isenabled"]:
-            helpers.log_disabled_integration("Browser")
-            return
-        
-        if recipient in ["site", "google", "youtube", "gmail", "amazon"]:
-            search = message.strip()
-
-            if recipient == "site":
-                if config.config["browsersite_isenabled"]:
-                    browser.BrowserSite(search)
-                else:
-                    helpers.log_disabled_integration("BrowserSite")
-            elif recipient == "google":
-                if config.config["browsergoogle_isenabled"]:
-                    browser.BrowserGoogle(search)
-                else:
-                    helpers.log_disabled_integration("BrowserGoogle")
-            elif recipient == "youtube":
-                if config.config["browseryoutube_isenabled"]:
-                    browser.BrowserYoutube(search)
-                else:
-                    helpers.log_disabled_integration("BrowserYoutube")
-            elif recipient == "gmail":
-                if config.config["browsergmail_isenabled"]:
-                    browser.BrowserGmail(search)
-                else:
-                    helpers.log_disabled_integration("BrowserGmail")
-            elif recipient == "amazon":
-                if config.config["browseramazon_isenabled"]:
-                    browser.BrowserAmazon(search)
-                else:
-                    helpers.log_disabled_integration("BrowserAmazon")
-        else:
-            logging.error("Unknown Browser command or the integration is not enabled.")
-
-    elif integration == "computer":
-        if not config.config["computer_isenabled"]:
-            helpers.log_disabled_integration("Computer")
-            return
-
-        if recipient in ["volume", "run", "media", "power"]:
-            if recipient == "volume":
-                if config.config["computervolume_isenabled"]:
-                    computer.ComputerVolume(text)
-                    return
-                else:
-                    helpers.log_disabled_integration("ComputerVolume")
-            elif recipient == "run":
-                if config.config["computerrun_isenabled"]:
-                    computer.ComputerRun(text)
-                    return
-                else:
-                    helpers.log_disabled_integration("ComputerSite")
-            elif recipient == "media":
-                if config.config["computermedia_isenabled"]:
-                    computer.ComputerMedia(text)
-                    return
-                else:
-                    helpers.log_disabled_integration("ComputerMedia")
-            elif recipient == "power":
-                if config.config["computerpower_isenabled"]:
-                    computer.ComputerPower(text)
-                    return
-                else:
-                    helpers.log_disabled_integration("ComputerPower")
-        else:
-            logging.error("Unknown Computer command or the integration is not enabled.")
-
-    elif integration == "discord":
-        page = context.new_page()  # Open a new page
-        if config.config["discord_isenabled"]:
-            if config.config["discordtext_isenabled"]:
-                discord.DiscordText(page, recipient, message)
-                return
-            else:
-                helpers.log_disabled_integration("DiscordText")
-        else:
-            helpers.log_disabled_integration("Discord")
-
-    elif integration == "facebook":
-        page = context.new_page()  # Open a new page
-        if config.config["facebook_isenabled"]:
-            if config.config["facebooktext_isenabled"]:
-                facebook.FacebookText(page, recipient, message)
-                return
-            else:
-                helpers.log_disabled_integration("FacebookText")
-        else:
-            helpers.log_disabled_integration("Facebook")
-
-    elif integration == "google":
-        page = context.new_page()  # Open a new page
-        if config.config["google_isenabled"]:
-            if config.config["googlehome_isenabled"]:
-                google.GoogleHome(page, message)
-                return
-            else:
-                helpers.log_disabled_integration("GoogleHome")
-        else:
-            helpers.log_disabled_integration("Google")
+            logging.error(f"Invalid pause time: {task.recipient}. Must be a number.")
+            return result("invalid", f"Invalid pause time: {task.recipient}")
 
-    elif integration == "lamathome":
-        if not config.config["lamathome_isenabled"]:
-            helpers.log_disabled_integration("LAMatHome")
-            return
+    spec = integrations.get(task.integration)
+    if spec is None:
+        logging.error("Unknown command type.")
+        return result("invalid", "Unknown command type.")
 
-        if recipient == "terminate":
-            if config.config["lamathometerminate_isenabled"]:
-                lam_at_home.terminate()
-            else:
-                logging.error("Unknown LAMatHome command or the integration is not enabled.")
-    
-    elif integration == "openinterpreter":
-        if not config.config["openinterpreter_isenabled"]:
-            helpers.log_disabled_integration("OpenInterpreter")
-            return
-
-        if config.config["openinterpreter_isenabled"]:
-            message_OI = ' '.join(words[1:]).strip()
-            open_interpreter.openinterpretercall(message_OI)
-        else:
-            logging.error("Unknown OpenInterpreter command or the integration is not enabled.")
+    if not config.config[spec["flag"]]:
+        helpers.log_disabled_integration(spec["name"])
+        return result("disabled", spec["name"])
 
-    elif integration == "telegram":
-        if config.config["telegram_isenabled"]:
-            if config.config["telegramtext_isenabled"]:
-                telegram.TelegramText(context, recipient, message)
-                return
-            else:
-                helpers.log_disabled_integration("TelegramText")
-        else:
-            helpers.log_disabled_integration("Telegram")
+    command = spec["commands"].get(task.recipient) or spec["commands"].get(ANY_COMMAND)
+    if command is None:
+        logging.error(f"Unknown {spec['name']} command or the integration is not enabled.")
+        return result("invalid", f"Unknown {spec['name']} command")
 
-    elif integration == "homeassistant":
-        if config.config["homeassistant_isenabled"]:
-            result = homeassistant.control_homeassistant(text)
-            logging.info(result)
-        else:
-            helpers.log_disabled_integration("HomeAssistant")
+    flag, name, handler = command
+    if flag and not config.config[flag]:
+        helpers.log_disabled_integration(name)
+        return result("disabled", name)
+
+    module = load_integration(spec["module"])
+    if spec["family"] is None:
+        # e.g. lamathome terminate, which must exit from the main thread
+        handler(module, context, task)
+        return result("ok")
 
+    timeout = task_timeout(task.integration)
+    if spec["page"]:
+        status, detail = _run_on_page(module, context, handler, task, timeout, spec["page"])
     else:
-        logging.error("Unknown command type.")
+        status, detail = _run_in_thread(module, context, handler, task, timeout, spec["cancel"])
+
+    if status == "timeout":
+        logging.error(f"Task '{text}' timed out after {timeout:g} seconds: {detail}")
+    elif status == "error":
+        logging.error(f"Task '{text}' failed: {detail}")
+    return result(status, detail)
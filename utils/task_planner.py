@@ -0,0 +1,230 @@
+import time
+import logging
+import threading
+from concurrent.futures import wait
+from utils import config, task_executor, work_queues
+from utils.scheduler import scheduler
+
+# Lanes whose tasks wait for every task before them and hold back the ones
+# after: a pause, and lamathome, whose terminate exits once they have run
+BARRIER_LANES = ("pause", "lamathome")
+
+
+class TaskNode:
+    def __init__(self, index, text, lane, family):
+        self.index = index
+        self.text = text
+        self.lane = lane
+        self.family = family
+        self.deps = []
+        self.queued = None
+        self.result = None
+        self.start = None
+        self.end = None
+
+    @property
+    def status(self):
+        return self.result.status if self.result else "pending"
+
+    @property
+    def duration(self):
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+
+def build_plan(tasks):
+    '''
+    Builds a dependency graph from a list of task strings and batches.
+    A task depends on the previous task in its lane, so tasks on the same
+    integration keep their order. A pause or lamathome task depends on
+    everything before it and everything after it depends on that task. The
+    work queues decide when tasks actually run; the trace combines these edges
+    with the queue order.
+    '''
+    parallel = config.config.get("parallel_tasks_isenabled", True)
+    nodes = []
+    last_in_lane = {}
+    since_barrier = []
+    barrier = None
+
+    for index, text in enumerate(tasks):
+        lane, family = task_executor.task_route(text)
+        node = TaskNode(index, text, lane, family)
+
+        if lane in BARRIER_LANES:
+            node.deps = list(since_barrier) or ([barrier] if barrier else [])
+            barrier = node
+            since_barrier = []
+            last_in_lane = {}
+        else:
+            previous = last_in_lane.get(lane) if parallel else (nodes[-1] if nodes else None)
+            if previous is not None:
+                node.deps.append(previous)
+            elif barrier is not None:
+                node.deps.append(barrier)
+            last_in_lane[lane] = node
+            since_barrier.append(node)
+
+        nodes.append(node)
+    return nodes
+
+
+def _run_node(context, node):
+    node.start = time.perf_counter()
+    try:
+        node.result = task_executor.execute_task(context, node.text)
+    except Exception as e:
+        logging.error(f"Task '{task_executor.describe(node.text)}' failed: {e}")
+        node.result = task_executor.TaskResult(task_executor.describe(node.text), "error", time.perf_counter() - node.start, str(e))
+    finally:
+        node.end = time.perf_counter()
+    return node
+
+
+def split_at_pause(tasks):
+    '''
+    Splits tasks at the first valid pause task.
+    Returns (tasks before the pause, pause seconds or None, tasks after it).
+    '''
+    for index, text in enumerate(tasks):
+        task = task_executor.parse_task(text)
+        if task is None or task.integration != "pause":
+            continue
+        try:
+            delay = float(task.recipient)
+        except ValueError:
+            continue  # execute_task reports the invalid pause
+        return tasks[:index], delay, tasks[index + 1:]
+    return tasks, None, []
+
+
+def run_tasks(tasks):
+    '''
+    Submits a list of task strings to their integration family's work queue
+    and returns without waiting for them. Each queue serves its tasks in
+    priority order and, for equal priorities, in submission order, which keeps
+    tasks on the same integration in order. Tasks without a family run on the
+    calling thread, a pause or lamathome task only once everything queued
+    before it has finished. With the scheduler enabled, a pause hands the
+    tasks after it to the timer scheduler. The timer is saved right away, so
+    the tasks survive a restart, and starts counting down once everything
+    before the pause has finished.
+    '''
+    later, delay, timer_id = [], None, None
+    if config.config.get("scheduler_isenabled", True):
+        tasks, delay, later = split_at_pause(tasks)
+        if later:
+            timer_id = scheduler.schedule(delay, later, hold=True)
+
+    # consecutive messages to the same recipient are sent in one session
+    nodes = build_plan(task_executor.batch_tasks(tasks))
+    started = time.perf_counter()
+
+    def finish():
+        if nodes:
+            log_trace(nodes, started)
+        if timer_id:
+            scheduler.release(timer_id, delay)
+
+    remaining = [len(nodes)]
+    lock = threading.Lock()
+
+    def node_done(_=None):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            finish()
+
+    if not nodes:
+        finish()
+        return nodes
+
+    parallel = config.config.get("parallel_tasks_isenabled", True)
+    outstanding = []
+    for node in nodes:
+        node.queued = time.perf_counter()
+
+        if node.family is None:
+            # a pause without the scheduler, or a terminate, waits for everything before it
+            if node.lane in BARRIER_LANES and outstanding:
+                wait(outstanding)
+            _run_node(None, node)
+            node_done()
+            continue
+
+        try:
+            future = work_queues.get_queue(node.family).submit(
+                lambda context, node=node: _run_node(context, node),
+                priority=work_queues.priority_for(node.lane),
+            )
+        except work_queues.QueueFullError as e:
+            logging.error(f"Dropping task '{task_executor.describe(node.text)}': {e}")
+            node.start = node.end = time.perf_counter()
+            node.result = task_executor.TaskResult(task_executor.describe(node.text), "rejected", 0.0, str(e))
+            node_done()
+            continue
+
+        outstanding.append(future)
+        future.add_done_callback(node_done)
+        if not parallel:
+            future.result()
+
+    return nodes
+
+
+def _blockers(node, nodes):
+    '''
+    Returns the tasks node had to wait for: its dependencies, and the task
+    that ran just before it on the same queue when it was queued before that
+    task finished. Queues order by priority, so the queue's real order is read
+    from the timings rather than from the plan.
+    '''
+    blockers = list(node.deps)
+    if node.family is not None and node.start is not None:
+        before = [other for other in nodes if other is not node and other.family == node.family
+                  and other.end is not None and other.end <= node.start]
+        if before:
+            previous = max(before, key=lambda n: n.end)
+            if previous.end > node.queued and previous not in blockers:
+                blockers.append(previous)
+    return blockers
+
+
+def critical_path(nodes):
+    '''
+    Returns the chain of tasks that determined the total run time, found by
+    walking back from the last task to finish through the latest finishing
+    task it waited for.
+    '''
+    finished = [node for node in nodes if node.end is not None]
+    if not finished:
+        return []
+    node = max(finished, key=lambda n: n.end)
+    path = [node]
+    blockers = _blockers(node, nodes)
+    while blockers:
+        node = max(blockers, key=lambda n: n.end or 0)
+        path.append(node)
+        blockers = _blockers(node, nodes)
+    return list(reversed(path))
+
+
+def log_trace(nodes, started):
+    '''
+    Logs a per-utterance trace with each task's timing and the critical path.
+    '''
+    total = max(node.end for node in nodes if node.end is not None) - started
+    if config.config.get("debug", False):
+        for node in nodes:
+            logging.info(
+                f"Trace: [{node.lane}] '{task_executor.describe(node.text)}' {node.status}, queued {node.start - node.queued:.2f}s, "
+                f"start +{node.start - started:.2f}s, took {node.duration:.2f}s"
+            )
+    statuses = {}
+    for node in nodes:
+        statuses[node.status] = statuses.get(node.status, 0) + 1
+    summary = ", ".join(f"{count} {status}" for status, count in statuses.items())
+    path = " -> ".join(f"[{node.lane}] {task_executor.describe(node.text)} ({node.duration:.2f}s)" for node in critical_path(nodes))
+    logging.info(f"Utterance finished in {total:.2f}s ({summary}), critical path: {path}")
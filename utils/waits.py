@@ -0,0 +1,115 @@
+import time
+import logging
+from contextlib import contextmanager
+from utils import config, helpers
+
+# Time spent in each named wait step, so the slowest ones can be tightened
+stats = {}
+
+
+def _timeout_ms(timeout=None):
+    # bounded by the step's own timeout, wait_timeout and the task's deadline;
+    # an expired deadline raises, since playwright reads a 0 ms timeout as none
+    helpers.check_deadline()
+    seconds = timeout if timeout is not None else config.config.get("wait_timeout", 30)
+    return max(1, min(seconds, helpers.time_left(seconds)) * 1000)
+
+
+def step(page):
+    '''
+    Checks the task's deadline and caps the page's default timeouts, which
+    goto, fill, click and the other raw page calls use, at the time left.
+    Integrations call this between steps, so a task cannot outlast its
+    timeout by starting each call with a fresh budget.
+    '''
+    helpers.check_deadline()
+    left = helpers.time_left()
+    if left is not None:
+        page.set_default_timeout(max(1, left * 1000))
+        page.set_default_navigation_timeout(max(1, left * 1000))
+
+
+def record(step, elapsed, ok=True):
+    entry = stats.setdefault(step, {"count": 0, "timeouts": 0, "total": 0.0, "max": 0.0})
+    entry["count"] += 1
+    entry["total"] += elapsed
+    entry["max"] = max(entry["max"], elapsed)
+    if not ok:
+        entry["timeouts"] += 1
+    if config.config.get("debug", False):
+        logging.info(f"Wait '{step}' took {elapsed:.2f}s" + ("" if ok else " and timed out"))
+
+
+@contextmanager
+def timed(step):
+    '''
+    Records the time spent in the wrapped block under step.
+    '''
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        record(step, time.perf_counter() - started, ok)
+
+
+def for_selector(page, selector, step, timeout=None, state="visible"):
+    '''
+    Waits until selector reaches state and returns the element handle.
+    '''
+    with timed(step):
+        return page.wait_for_selector(selector, state=state, timeout=_timeout_ms(timeout))
+
+
+def for_network_idle(page, step, timeout=None):
+    '''
+    Waits until the page has had no network connections for 500 ms.
+    '''
+    with timed(step):
+        page.wait_for_load_state("networkidle", timeout=_timeout_ms(timeout))
+
+
+def for_function(page, expression, step, timeout=None, arg=None):
+    '''
+    Waits until the javascript predicate expression returns a truthy value.
+    '''
+    with timed(step):
+        return page.wait_for_function(expression, arg=arg, timeout=_timeout_ms(timeout))
+
+
+@contextmanager
+def for_response(page, predicate, step, timeout=None):
+    '''
+    Waits for a response matching predicate to an action taken in the block.
+        with waits.for_response(page, lambda r: "/messages" in r.url, "send"):
+            page.keyboard.press("Enter")
+    '''
+    with timed(step):
+        with page.expect_response(predicate, timeout=_timeout_ms(timeout)) as response:
+            yield response
+
+
+def optional(wait, *args, **kwargs):
+    '''
+    Runs a wait that is allowed to time out, e.g. for a dialog that is only
+    sometimes shown. Returns the wait's result, or None if it timed out. The
+    task running out of time is still raised.
+    '''
+    try:
+        return wait(*args, **kwargs)
+    except helpers.TaskTimeoutError:
+        raise
+    except Exception:
+        return None
+
+
+def log_metrics():
+    '''
+    Logs each wait step from slowest to fastest by total time.
+    '''
+    for step, entry in sorted(stats.items(), key=lambda item: item[1]["total"], reverse=True):
+        logging.info(
+            f"Wait '{step}': {entry['count']} waits, avg {entry['total'] / entry['count']:.2f}s, "
+            f"max {entry['max']:.2f}s, {entry['timeouts']} timed out"
+        )
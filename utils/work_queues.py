@@ -0,0 +1,228 @@
+import time
+import queue
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+from utils import config
+
+# Integration families that get their own worker queue
+FAMILIES = ["homeassistant", "computer", "openinterpreter"]
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class WorkQueue:
+    '''
+    A bounded priority queue served by a single worker thread.
+    Lower priority values run first; equal priorities run in submission order.
+    An optional initializer runs on the worker thread before the first job and
+    its return value is handed to every job, which lets a queue own
+    thread-bound resources such as the playwright context. on_idle is called
+    with the same resource after every job and whenever the queue has been
+    empty for idle_interval seconds. refresh is called at the same points,
+    before on_idle, and returns the resource to use from then on, which lets a
+    queue swap in a fresh resource between jobs.
+    '''
+
+    def __init__(self, name: str, maxsize: int, initializer=None, finalizer=None, on_idle=None, refresh=None):
+        self.name = name
+        self.queue = queue.PriorityQueue(maxsize)
+        self.initializer = initializer
+        self.finalizer = finalizer
+        self.on_idle = on_idle
+        self.refresh = refresh
+        self.idle_interval = config.config.get("queue_idle_interval", 5)
+        self.resource = None
+        self.counter = itertools.count()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+            "service_total": 0.0,
+            "service_max": 0.0,
+        }
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._worker, name=f"lah-{self.name}", daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        '''
+        Stops the worker once the jobs already queued have run, and runs the
+        finalizer. Jobs still queued when the worker stops are cancelled.
+        '''
+        if self.thread is None:
+            return
+        try:
+            self.queue.put((float("inf"), next(self.counter), time.perf_counter(), None, None), timeout=timeout)
+        except queue.Full:
+            logging.error(f"Could not stop the {self.name} queue, it is still full")
+            return
+        self.thread.join(timeout)
+        self.thread = None
+
+    def submit(self, fn, priority: int = 0) -> Future:
+        '''
+        Queues fn(resource) and returns a Future with its result.
+        Raises QueueFullError when the queue stays full for longer than
+        queue_submit_timeout seconds.
+        '''
+        self.start()
+        future = Future()
+        try:
+            self.queue.put(
+                (priority, next(self.counter), time.perf_counter(), fn, future),
+                timeout=config.config.get("queue_submit_timeout", 1),
+            )
+        except queue.Full:
+            with self.lock:
+                self.stats["rejected"] += 1
+            raise QueueFullError(f"The {self.name} queue is full ({self.queue.maxsize} tasks)")
+        with self.lock:
+            self.stats["submitted"] += 1
+        return future
+
+    def _worker(self) -> None:
+        if self.initializer:
+            try:
+                self.resource = self.initializer()
+            except Exception as e:
+                logging.error(f"Failed to initialize the {self.name} queue: {e}")
+
+        while True:
+            try:
+                idle = self.on_idle or self.refresh
+                _, _, enqueued, fn, future = self.queue.get(timeout=self.idle_interval if idle else None)
+            except queue.Empty:
+                self._idle()
+                continue
+            if fn is None:
+                self._cancel_pending()
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started = time.perf_counter()
+            try:
+                future.set_result(fn(self.resource))
+            except BaseException as e:
+                future.set_exception(e)
+            finished = time.perf_counter()
+            self._record(started - enqueued, finished - started)
+            self._idle()
+
+        if self.finalizer:
+            try:
+                self.finalizer(self.resource)
+            except Exception as e:
+                logging.error(f"Failed to shut down the {self.name} queue: {e}")
+
+    def _cancel_pending(self) -> None:
+        # resolve the futures of jobs submitted after stop(), so nothing waits on them
+        while True:
+            try:
+                _, _, _, fn, future = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            if future is not None:
+                future.cancel()
+
+    def _idle(self) -> None:
+        if self.refresh:
+            try:
+                self.resource = self.refresh(self.resource)
+            except Exception as e:
+                logging.error(f"Failed to refresh the {self.name} queue: {e}")
+        if self.on_idle:
+            try:
+                self.on_idle(self.resource)
+            except Exception as e:
+                logging.error(f"Idle work on the {self.name} queue failed: {e}")
+
+    def _record(self, wait: float, service: float) -> None:
+        with self.lock:
+            self.stats["completed"] += 1
+            self.stats["wait_total"] += wait
+            self.stats["wait_max"] = max(self.stats["wait_max"], wait)
+            self.stats["service_total"] += service
+            self.stats["service_max"] = max(self.stats["service_max"], service)
+        if config.config.get("debug", False):
+            logging.info(f"{self.name} queue: waited {wait:.2f}s, ran {service:.2f}s, depth {self.queue.qsize()}")
+
+    def metrics(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        completed = stats["completed"] or 1
+        stats["depth"] = self.queue.qsize()
+        stats["wait_avg"] = stats["wait_total"] / completed
+        stats["service_avg"] = stats["service_total"] / completed
+        return stats
+
+
+queues = {}
+
+
+def setup(initializers: dict = None, finalizers: dict = None, idle_hooks: dict = None) -> None:
+    '''
+    Creates one queue per integration family and starts its worker.
+    initializers, finalizers and idle_hooks are keyed by family name.
+    '''
+    initializers = initializers or {}
+    finalizers = finalizers or {}
+    idle_hooks = idle_hooks or {}
+    sizes = config.config.get("queue_max_sizes", {})
+    for family in FAMILIES:
+        queues[family] = WorkQueue(
+            family,
+            sizes.get(family, 16),
+            initializer=initializers.get(family),
+            finalizer=finalizers.get(family),
+            on_idle=idle_hooks.get(family),
+        )
+        queues[family].start()
+
+
+def add_queue(work_queue: WorkQueue) -> None:
+    '''
+    Registers a queue created elsewhere, e.g. a browser lane, so tasks can be
+    routed to it and it is included in metrics and shutdown. Its worker starts
+    on the first submit.
+    '''
+    queues[work_queue.name] = work_queue
+
+
+def get_queue(family: str) -> WorkQueue:
+    if family not in queues:
+        queues[family] = WorkQueue(family, config.config.get("queue_max_sizes", {}).get(family, 16))
+    return queues[family]
+
+
+def priority_for(integration: str) -> int:
+    return config.config.get("task_priorities", {}).get(integration, 5)
+
+
+def metrics() -> dict:
+    return {name: work_queue.metrics() for name, work_queue in queues.items()}
+
+
+def log_metrics() -> None:
+    for name, stats in metrics().items():
+        if stats["submitted"] or stats["rejected"]:
+            logging.info(
+                f"{name} queue: {stats['completed']}/{stats['submitted']} done, {stats['rejected']} rejected, "
+                f"depth {stats['depth']}, wait avg {stats['wait_avg']:.2f}s max {stats['wait_max']:.2f}s, "
+                f"service avg {stats['service_avg']:.2f}s max {stats['service_max']:.2f}s"
+            )
+
+
+def shutdown(timeout: float = 10) -> None:
+    for work_queue in queues.values():
+        work_queue.stop(timeout)